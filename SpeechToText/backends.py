@@ -0,0 +1,191 @@
+"""Backends de inferencia de Whisper para el servicio de STT.
+
+- "transformers": pipeline de transformers tal cual (fp32 en CPU, fp16 en GPU)
+- "int8": el mismo modelo con cuantizacion dinamica de torch en las capas lineales (solo CPU)
+- "ctranslate2": modelo convertido con convert_ct2.py y ejecutado por CTranslate2
+"""
+import numpy as np
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList, pipeline
+
+from commands import STT_COMMAND_MAX_TOKENS, STT_COMMAND_PROMPT, match_command
+from metrics import TOKENS_GENERATED
+
+STT_BACKENDS = ("transformers", "int8", "ctranslate2")
+SAMPLE_RATE = 16000
+FALLBACK_MODEL = "openai/whisper-small"
+LANGUAGE = "spanish"
+
+
+class CommandStoppingCriteria(StoppingCriteria):
+    """Corta el generate cuando el texto parcial ya resuelve un comando.
+
+    Se exige que la misma accion siga matcheando un token despues, para no cortar en la
+    mitad de una palabra ("regist" -> "registro") ni antes del valor de fill_email.
+    """
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.prefix_len = None
+        self.last_action = None
+        self.steps = 0
+        self.early_exit = False
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.prefix_len is None:
+            # En la primera llamada ya hay un token generado despues del prompt del decoder
+            self.prefix_len = input_ids.shape[1] - 1
+        self.steps += 1
+        text = self.tokenizer.decode(input_ids[0, self.prefix_len:], skip_special_tokens=True)
+        action = match_command(text)["action"]
+        done = action != "unknown" and action == self.last_action
+        self.last_action = action
+        self.early_exit = done
+        return torch.full((input_ids.shape[0],), done, dtype=torch.bool, device=input_ids.device)
+
+
+class TransformersBackend:
+    """Pipeline de transformers; con quantize=True cuantiza los Linear a int8."""
+
+    def __init__(self, model_path: str, device: str = "cpu", quantize: bool = False):
+        torch_dtype = torch.float16 if device.startswith("cuda") else torch.float32
+        try:
+            # low_cpu_mem_usage: los pesos (safetensors, mapeados en memoria) se cargan
+            # directo sin inicializar antes un modelo aleatorio
+            self.pipe = pipeline(
+                "automatic-speech-recognition", model=model_path, device=device, torch_dtype=torch_dtype,
+                model_kwargs={"low_cpu_mem_usage": True},
+            )
+            print(" Modelo Custom Argentino cargado exitosamente.")
+        except Exception as e:
+            print(f"Error cargando modelo custom ({e}).")
+            self.pipe = pipeline("automatic-speech-recognition", model=FALLBACK_MODEL, device=device)
+            print(" Modelo Base cargado.")
+
+        if quantize:
+            if device != "cpu":
+                raise ValueError("The int8 STT backend only runs on CPU")
+            self.pipe.model = torch.ao.quantization.quantize_dynamic(
+                self.pipe.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+    def transcribe(self, audio: np.ndarray, generate_kwargs: dict) -> str:
+        result = self.pipe({"raw": audio, "sampling_rate": SAMPLE_RATE}, generate_kwargs=generate_kwargs)
+        # El pipeline no devuelve los ids: se re-tokeniza el texto (despreciable frente al generate)
+        TOKENS_GENERATED.observe(len(self.pipe.tokenizer.encode(result["text"], add_special_tokens=False)))
+        return result["text"].strip()
+
+    def transcribe_batch(self, audios: list) -> list:
+        """Un solo generate (greedy) para varios clips ya decodificados a 16 kHz."""
+        features = self.pipe.feature_extractor(audios, sampling_rate=SAMPLE_RATE, return_tensors="pt")
+        model = self.pipe.model
+        # Con int8 los pesos cuantizados no tienen dtype de punto flotante; la entrada va en fp32
+        dtype = torch.float16 if model.device.type == "cuda" else torch.float32
+        input_features = features.input_features.to(model.device, dtype=dtype)
+        with torch.no_grad():
+            predicted_ids = model.generate(input_features, language=LANGUAGE, task="transcribe", num_beams=1)
+        pad_token_id = self.pipe.tokenizer.pad_token_id
+        for tokens in (predicted_ids != pad_token_id).sum(dim=1).tolist():
+            TOKENS_GENERATED.observe(tokens)
+        texts = self.pipe.tokenizer.batch_decode(predicted_ids, skip_special_tokens=True)
+        return [text.strip() for text in texts]
+
+    def transcribe_command(self, audio: np.ndarray) -> dict:
+        """Generate sesgado al vocabulario de comandos, con corte apenas hay un comando claro."""
+        tokenizer = self.pipe.tokenizer
+        model = self.pipe.model
+        features = self.pipe.feature_extractor([audio], sampling_rate=SAMPLE_RATE, return_tensors="pt")
+        dtype = torch.float16 if model.device.type == "cuda" else torch.float32
+        input_features = features.input_features.to(model.device, dtype=dtype)
+        prompt_ids = torch.as_tensor(tokenizer.get_prompt_ids(STT_COMMAND_PROMPT), device=model.device)
+        criteria = CommandStoppingCriteria(tokenizer)
+        with torch.no_grad():
+            predicted_ids = model.generate(
+                input_features,
+                language=LANGUAGE,
+                task="transcribe",
+                num_beams=1,
+                prompt_ids=prompt_ids,
+                max_new_tokens=STT_COMMAND_MAX_TOKENS,
+                stopping_criteria=StoppingCriteriaList([criteria]),
+            )
+        # Segun la version, la salida puede incluir el prompt: se decodifica desde <|notimestamps|>
+        ids = predicted_ids[0].tolist()
+        marker = tokenizer.convert_tokens_to_ids("<|notimestamps|>")
+        if marker in ids:
+            ids = ids[ids.index(marker) + 1:]
+        text = tokenizer.decode(ids, skip_special_tokens=True).strip()
+        TOKENS_GENERATED.observe(len(ids))
+        return {"text": text, "steps": criteria.steps, "early_exit": criteria.early_exit}
+
+
+class CTranslate2Backend:
+    """Whisper convertido a CTranslate2 (ver convert_ct2.py), por defecto con pesos int8."""
+
+    def __init__(self, model_path: str, device: str = "cpu", compute_type: str = "int8", workers: int = 1,
+                 threads: int = 0):
+        try:
+            import ctranslate2
+        except ImportError as e:
+            raise RuntimeError("STT_BACKEND=ctranslate2 requires the ctranslate2 package") from e
+        from transformers import WhisperProcessor
+
+        self.ctranslate2 = ctranslate2
+        # La conversion guarda el processor junto al modelo
+        self.processor = WhisperProcessor.from_pretrained(model_path)
+        # inter_threads: cuantos generate pueden correr en paralelo (uno por worker)
+        self.model = ctranslate2.models.Whisper(
+            model_path,
+            device="cuda" if device.startswith("cuda") else "cpu",
+            compute_type=compute_type,
+            inter_threads=max(1, workers),
+            intra_threads=threads,
+        )
+        tokenizer = self.processor.tokenizer
+        self.prompt = tokenizer.convert_tokens_to_ids(
+            ["<|startoftranscript|>", "<|es|>", "<|transcribe|>", "<|notimestamps|>"]
+        )
+        # Contexto previo (<|startofprev|> + vocabulario) para el modo comando
+        self.command_prompt = (
+            tokenizer.convert_tokens_to_ids(["<|startofprev|>"])
+            + tokenizer.encode(" " + STT_COMMAND_PROMPT, add_special_tokens=False)
+            + self.prompt
+        )
+        print(f" Modelo CTranslate2 ({compute_type}) cargado exitosamente.")
+
+    def _generate(self, audios: list) -> list:
+        features = self.processor.feature_extractor(audios, sampling_rate=SAMPLE_RATE, return_tensors="np")
+        storage = self.ctranslate2.StorageView.from_array(np.ascontiguousarray(features.input_features))
+        results = self.model.generate(storage, [self.prompt] * len(audios), beam_size=1)
+        for result in results:
+            TOKENS_GENERATED.observe(len(result.sequences_ids[0]))
+        texts = self.processor.tokenizer.batch_decode(
+            [result.sequences_ids[0] for result in results], skip_special_tokens=True
+        )
+        return [text.strip() for text in texts]
+
+    def transcribe(self, audio: np.ndarray, generate_kwargs: dict) -> str:
+        return self._generate([audio])[0]
+
+    def transcribe_batch(self, audios: list) -> list:
+        return self._generate(audios)
+
+    def transcribe_command(self, audio: np.ndarray) -> dict:
+        # CTranslate2 no expone un corte por paso: se acota la longitud y se sesga con el prompt
+        features = self.processor.feature_extractor([audio], sampling_rate=SAMPLE_RATE, return_tensors="np")
+        storage = self.ctranslate2.StorageView.from_array(np.ascontiguousarray(features.input_features))
+        result = self.model.generate(
+            storage, [self.command_prompt], beam_size=1,
+            max_length=len(self.command_prompt) + STT_COMMAND_MAX_TOKENS,
+        )[0]
+        text = self.processor.tokenizer.decode(result.sequences_ids[0], skip_special_tokens=True).strip()
+        TOKENS_GENERATED.observe(len(result.sequences_ids[0]))
+        return {"text": text, "steps": len(result.sequences_ids[0]), "early_exit": False}
+
+
+def load_backend(backend: str, model_path: str, device: str = "cpu", workers: int = 1):
+    if backend not in STT_BACKENDS:
+        raise ValueError(f"Unknown STT_BACKEND: {backend}")
+    if backend == "ctranslate2":
+        return CTranslate2Backend(model_path, device=device, workers=workers)
+    return TransformersBackend(model_path, device=device, quantize=backend == "int8")
@@ -0,0 +1,89 @@
+"""Latencia de decodificacion de clips cortos WebM/Opus (como los del push-to-talk):
+archivo temporal + ffmpeg (camino anterior), ffmpeg por pipe y PyAV en proceso.
+
+    python benchmark_decode.py               # genera un clip sintetico de 2 s
+    python benchmark_decode.py clip.webm --repeats 50
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+import av
+import numpy as np
+
+from main import SAMPLE_RATE, decode_audio_ffmpeg, decode_audio_pyav
+
+
+def synthetic_webm(seconds: float = 2.0, sample_rate: int = 48000) -> bytes:
+    # Mismo formato que manda el MediaRecorder del navegador: Opus a 48 kHz en WebM
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    signal = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.02 * np.random.default_rng(0).standard_normal(t.size)
+    samples = signal.astype(np.float32).reshape(1, -1)
+
+    buffer = io.BytesIO()
+    with av.open(buffer, mode="w", format="webm") as container:
+        stream = container.add_stream("libopus", rate=sample_rate)
+        stream.layout = "mono"
+        frame_size = 960
+        for start in range(0, samples.shape[1], frame_size):
+            frame = av.AudioFrame.from_ndarray(samples[:, start:start + frame_size], format="flt", layout="mono")
+            frame.sample_rate = sample_rate
+            frame.pts = start
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    return buffer.getvalue()
+
+
+def decode_tempfile_ffmpeg(data: bytes) -> np.ndarray:
+    # Camino anterior: el upload se guardaba en un .webm y el pipeline lo leia de disco
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_audio:
+        temp_audio.write(data)
+        temp_path = temp_audio.name
+    try:
+        with open(temp_path, "rb") as f:
+            return decode_audio_ffmpeg(f.read())
+    finally:
+        os.remove(temp_path)
+
+
+DECODERS = {
+    "tempfile+ffmpeg": decode_tempfile_ffmpeg,
+    "ffmpeg pipe": decode_audio_ffmpeg,
+    "pyav": decode_audio_pyav,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("clip", nargs="?", help="Clip de audio (por defecto uno sintetico de 2 s)")
+    parser.add_argument("--repeats", type=int, default=30)
+    args = parser.parse_args()
+
+    if args.clip:
+        with open(args.clip, "rb") as f:
+            data = f.read()
+    else:
+        data = synthetic_webm()
+
+    print(f"clip: {len(data)} bytes\n")
+    print(f"{'decoder':<16} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'seconds':>8}")
+    for name, decode in DECODERS.items():
+        audio = decode(data)  # warm-up
+        timings = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            decode(data)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        print(
+            f"{name:<16} {sum(timings) / len(timings):>9.2f} {timings[len(timings) // 2]:>9.2f} "
+            f"{timings[min(len(timings) - 1, int(0.95 * len(timings)))]:>9.2f} {len(audio) / SAMPLE_RATE:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
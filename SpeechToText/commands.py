@@ -0,0 +1,40 @@
+"""Decodificacion de comandos de voz con vocabulario acotado.
+
+La gramatica replica los patrones de VoiceService.interpretCommand del backend, asi el
+servicio de STT puede devolver la intencion directamente. El prompt sesga a Whisper hacia
+ese vocabulario y CommandStoppingCriteria (backends.py) corta el generate apenas hay un
+comando claro. Este modulo no importa torch ni transformers.
+"""
+import os
+import re
+
+
+COMMAND_PATTERNS = (
+    # \b evita matches dentro de otras palabras ("reentrar", "camarada"); las formas con
+    # pronombre ("registrarme", "regístrate") van explicitas
+    (re.compile(r"\b(login|inicio|entrar|ingresar(?:me|se)?)\b"), "navigate_login", None),
+    (re.compile(r"\b(registro|registrar(?:me|se)?|reg[ií]str(?:ate|ame)|crear cuenta)\b"), "navigate_register", None),
+    (re.compile(r"\b(cámara|camara|visión|vision)\b"), "navigate_camera", None),
+    (re.compile(r"\bescribir\s+(.+?)\s+en\s+(email|correo)\b"), "fill_email", lambda m: {"value": m.group(1)}),
+)
+
+# Texto previo que Whisper toma como contexto (no se transcribe)
+STT_COMMAND_PROMPT = os.getenv(
+    "STT_COMMAND_PROMPT", "Login. Registro, crear cuenta. Cámara, visión. Escribir en email, en correo."
+)
+STT_COMMAND_MAX_TOKENS = int(os.getenv("STT_COMMAND_MAX_TOKENS", "32"))
+
+
+def match_command(text: str) -> dict:
+    """Mismo resultado que interpretCommand: el primer patron que matchea gana."""
+    lower_text = text.lower()
+    for pattern, action, extract in COMMAND_PATTERNS:
+        match = pattern.search(lower_text)
+        if match:
+            return {
+                "action": action,
+                "parameters": extract(match) if extract else {},
+                "confidence": 0.95,
+                "originalText": text,
+            }
+    return {"action": "unknown", "parameters": {}, "confidence": 0, "originalText": text}
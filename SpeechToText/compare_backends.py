@@ -0,0 +1,115 @@
+"""Compara WER y latencia de los backends de STT sobre un set de evaluacion local.
+
+El set es un TSV con "archivo<TAB>transcripcion de referencia" por linea; las rutas de
+audio son relativas al TSV. Cada backend se carga con su propio MODEL_PATH:
+
+    python compare_backends.py eval/manifest.tsv \\
+        --backend transformers=speech-to-text-andreani/whisper_argentino \\
+        --backend int8=speech-to-text-andreani/whisper_argentino \\
+        --backend ctranslate2=whisper_argentino_ct2
+"""
+import argparse
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+from backends import load_backend
+from main import GENERATE_KWARGS, SAMPLE_RATE, decode_audio_pyav
+
+
+def load_eval_set(manifest: str) -> list:
+    base = os.path.dirname(os.path.abspath(manifest))
+    items = []
+    with open(manifest, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            path, reference = line.rstrip("\n").split("\t", 1)
+            with open(os.path.join(base, path), "rb") as audio_file:
+                items.append((path, decode_audio_pyav(audio_file.read()), reference))
+    return items
+
+
+def normalize(text: str) -> list:
+    return re.sub(r"[^\w\s]", " ", text.lower()).split()
+
+
+def word_errors(hypothesis: str, reference: str) -> tuple:
+    """Distancia de edicion por palabras; devuelve (errores, palabras de la referencia)."""
+    hyp, ref = normalize(hypothesis), normalize(reference)
+    row = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, hyp_word in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (ref_word != hyp_word))
+    return row[-1], len(ref)
+
+
+def run_backend(name: str, model_path: str, items: list, repeats: int) -> dict:
+    load_start = time.perf_counter()
+    backend = load_backend(name, model_path)
+    load_s = time.perf_counter() - load_start
+    backend.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), GENERATE_KWARGS)
+
+    latencies, errors, words, hypotheses = [], 0, 0, []
+    for path, audio, reference in items:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            text = backend.transcribe(audio, GENERATE_KWARGS)
+            latencies.append((time.perf_counter() - start) * 1000)
+        item_errors, item_words = word_errors(text, reference)
+        errors += item_errors
+        words += item_words
+        hypotheses.append({"file": path, "reference": reference, "hypothesis": text})
+
+    audio_s = sum(len(audio) for _, audio, _ in items) / SAMPLE_RATE
+    latencies.sort()
+    return {
+        "backend": name,
+        "model_path": model_path,
+        "load_s": load_s,
+        "wer": errors / max(1, words),
+        "mean_ms": sum(latencies) / len(latencies),
+        "p95_ms": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+        # Tiempo de computo por segundo de audio (menor es mejor)
+        "rtf": sum(latencies) / 1000 / repeats / audio_s,
+        "hypotheses": hypotheses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("manifest")
+    parser.add_argument("--backend", action="append", required=True, metavar="NAME=MODEL_PATH")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--output", help="Guardar los resultados completos (hipotesis incluidas) en JSON")
+    args = parser.parse_args()
+
+    items = load_eval_set(args.manifest)
+    if not items:
+        raise SystemExit(f"No clips found in {args.manifest}")
+
+    results = []
+    for spec in args.backend:
+        name, _, model_path = spec.partition("=")
+        results.append(run_backend(name, model_path, items, args.repeats))
+
+    baseline_ms = results[0]["mean_ms"]
+    print(f"{len(items)} clips, {args.repeats} repeats each\n")
+    print(f"{'backend':<14} {'load s':>7} {'WER':>6} {'mean ms':>9} {'p95 ms':>9} {'RTF':>6} {'speedup':>8}")
+    for r in results:
+        print(
+            f"{r['backend']:<14} {r['load_s']:>7.1f} {r['wer']:>6.3f} {r['mean_ms']:>9.1f} "
+            f"{r['p95_ms']:>9.1f} {r['rtf']:>6.3f} {baseline_ms / r['mean_ms']:>7.2f}x"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
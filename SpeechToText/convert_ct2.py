@@ -0,0 +1,34 @@
+"""Convierte el Whisper fine-tuneado (formato transformers) a CTranslate2 para STT_BACKEND=ctranslate2.
+
+    python convert_ct2.py speech-to-text-andreani/whisper_argentino whisper_argentino_ct2 --quantization int8
+
+Despues apuntar MODEL_PATH al directorio de salida.
+"""
+import argparse
+
+from transformers import WhisperProcessor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("model_dir", help="Checkpoint de transformers (el fine-tuning argentino)")
+    parser.add_argument("output_dir")
+    parser.add_argument("--quantization", default="int8",
+                        help="int8, int8_float32, int8_float16, float16 o float32")
+    parser.add_argument("--force", action="store_true", help="Sobrescribir output_dir si ya existe")
+    args = parser.parse_args()
+
+    try:
+        from ctranslate2.converters import TransformersConverter
+    except ImportError:
+        raise SystemExit("ctranslate2 is not installed (pip install ctranslate2)")
+
+    converter = TransformersConverter(args.model_dir)
+    converter.convert(args.output_dir, quantization=args.quantization, force=args.force)
+    # El backend usa el feature extractor y el tokenizer del mismo checkpoint
+    WhisperProcessor.from_pretrained(args.model_dir).save_pretrained(args.output_dir)
+    print(f"Modelo convertido ({args.quantization}) en {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Varios procesos de STT con un solo Whisper cargado antes del fork.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+preload_app importa main.py en el master con STT_PRELOAD_MODEL=1; los workers comparten
+los pesos copy-on-write y cada uno hace su warm-up y levanta sus STT_WORKERS hilos.
+Los hilos de torch se reparten por proceso (cpu_count / STT_WORKERS), asi que con N
+workers de gunicorn conviene fijar OMP_NUM_THREADS para no sobresuscribir la CPU.
+RSS y PSS por worker en /stats.
+"""
+import os
+import shutil
+
+os.environ.setdefault("STT_PRELOAD_MODEL", "1")
+# /metrics suma todos los workers: cada proceso escribe sus valores en este directorio.
+# Tiene que existir antes de que preload_app importe prometheus_client, y el master lo
+# vacia una sola vez (un HUP vuelve a ejecutar este archivo con los workers vivos)
+METRICS_DIR = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+if os.environ.get("PROMETHEUS_MULTIPROC_MASTER") != str(os.getpid()):
+    os.environ["PROMETHEUS_MULTIPROC_MASTER"] = str(os.getpid())
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 300
+
+
+def post_worker_init(worker):
+    from memory import process_memory
+
+    print(f" Worker {worker.pid} iniciado: {process_memory()}")
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    # Saca los gauges livesum del worker que termino
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,84 +1,769 @@
+import time
+
+# Inicio de la fase "import" del arranque; transformers se importa recien en el loader
+IMPORT_START = time.perf_counter()
+
+import asyncio
+import contextvars
+import io
+import json
 import os
-import tempfile
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+import queue
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from typing import Optional
+
+import av
+import numpy as np
 import torch
-from transformers import pipeline
+from fastapi import FastAPI, File, Query, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+
+from commands import match_command
+from memory import process_memory, workers_memory
+from metrics import (
+    BATCH_SIZE,
+    CLIPS,
+    COMMAND_REQUESTS,
+    QUEUE_DEPTH,
+    REQUEST_ID_HEADER,
+    VAD_SKIPPED_SECONDS,
+    WORKERS_BUSY,
+    install_request_tracing,
+    metrics_response,
+    observe_stage,
+    request_id_var,
+    stage,
+)
 
-app = Flask(__name__)
-CORS(app)
+app = FastAPI()
+IMPORT_SECONDS = time.perf_counter() - IMPORT_START
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Server-Timing"],
+)
+install_request_tracing(app)
 
 MODEL_PATH = os.getenv("MODEL_PATH", "openai/whisper-small")
+# "transformers" (fp32) | "int8" (cuantizacion dinamica de torch) | "ctranslate2" (MODEL_PATH convertido)
+STT_BACKEND = os.getenv("STT_BACKEND", "transformers")
+# Cargar el modelo al importar, en el master de gunicorn --preload (ver gunicorn.conf.py)
+STT_PRELOAD_MODEL = os.getenv("STT_PRELOAD_MODEL", "0") == "1"
+# Hilos de inferencia que comparten el mismo modelo y tamaño de la cola de espera
+STT_WORKERS = int(os.getenv("STT_WORKERS", "1"))
+STT_QUEUE_SIZE = int(os.getenv("STT_QUEUE_SIZE", "8"))
+STT_REQUEST_TIMEOUT_SECONDS = float(os.getenv("STT_REQUEST_TIMEOUT_SECONDS", "30"))
+# Batching dinamico (opcional): junta pedidos concurrentes en un solo generate
+STT_BATCHING = os.getenv("STT_BATCHING", "0") == "1"
+STT_BATCH_MAX_SIZE = int(os.getenv("STT_BATCH_MAX_SIZE", "8"))
+STT_BATCH_MAX_WAIT_MS = float(os.getenv("STT_BATCH_MAX_WAIT_MS", "10"))
+# "pyav": decodifica en el proceso desde los bytes | "ffmpeg": un subproceso ffmpeg por pedido
+STT_DECODER = os.getenv("STT_DECODER", "pyav")
+# Streaming por WebSocket: ventana deslizante para parciales y cierre por silencio
+STT_STREAM_WINDOW_SECONDS = float(os.getenv("STT_STREAM_WINDOW_SECONDS", "10"))
+STT_STREAM_STEP_MS = float(os.getenv("STT_STREAM_STEP_MS", "500"))
+STT_STREAM_ENDPOINT_MS = float(os.getenv("STT_STREAM_ENDPOINT_MS", "700"))
+STT_STREAM_MAX_SECONDS = float(os.getenv("STT_STREAM_MAX_SECONDS", "30"))
+STT_SILENCE_THRESHOLD_DB = float(os.getenv("STT_SILENCE_THRESHOLD_DB", "-40"))
+# VAD por energia antes de Whisper: recorta silencios y evita correr el modelo sin voz
+STT_VAD = os.getenv("STT_VAD", "1") == "1"
+STT_VAD_MIN_SPEECH_MS = float(os.getenv("STT_VAD_MIN_SPEECH_MS", "150"))
+STT_VAD_PAD_MS = float(os.getenv("STT_VAD_PAD_MS", "200"))
 # Detectar dispositivo
 DEVICE = "cuda:0" if torch.cuda.is_available() else "cpu"
-torch_dtype = torch.float16 if torch.cuda.is_available() else torch.float32
+
+SAMPLE_RATE = 16000
+GENERATE_KWARGS = {
+    "language": "spanish",
+    "task": "transcribe",
+    "num_beams": 1,
+    "temperature": 0.0
+}
 
 print(f" Ruta del modelo: {MODEL_PATH}")
 print(f" Dispositivo: {DEVICE}")
+print(f" Backend: {STT_BACKEND}")
 
-try:
-    pipe = pipeline(
-        "automatic-speech-recognition",
-        model=MODEL_PATH,
-        device=DEVICE,
-        torch_dtype=torch_dtype
-    )
-    print(" Modelo Custom Argentino cargado exitosamente.")
-except Exception as e:
-    print(f"Error cargando modelo custom ({e}).")
-    pipe = pipeline(
-        "automatic-speech-recognition",
-        model="openai/whisper-small",
-        device=DEVICE
-    )
-    print(" Modelo Base cargado.")
-
-@app.route('/health', methods=['GET'])
-def health():
-    return jsonify({"status": "ok", "service": "whisper-argentino-api"})
-
-@app.route('/transcribe', methods=['POST'])
-def transcribe():
-    if 'file' not in request.files:
-        return jsonify({"error": "No file part"}), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({"error": "No selected file"}), 400
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_audio:
-        file.save(temp_audio.name)
-        temp_path = temp_audio.name
+class InvalidAudioError(ValueError):
+    """El upload no se puede decodificar como audio: error del cliente (400)."""
+
 
+def decode_audio_pyav(data: bytes) -> np.ndarray:
+    """Decodifica el upload (WebM/Opus, WAV, ...) a float32 mono 16 kHz sin tocar disco
+    ni lanzar procesos."""
+    resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+    chunks = []
     try:
-        result = pipe(
-            temp_path,
-            generate_kwargs={
-                "language": "spanish",
-                "task": "transcribe",
-                "num_beams": 1,
-                "temperature": 0.0
-            }
-        )
-        
-        text = result["text"].strip()
-        print(f" Rápido: '{text}'")
+        with av.open(io.BytesIO(data), mode="r") as container:
+            if not container.streams.audio:
+                raise InvalidAudioError("Uploaded file has no audio stream")
+            stream = container.streams.audio[0]
+            for frame in container.decode(stream):
+                chunks.extend(out.to_ndarray()[0] for out in resampler.resample(frame))
+            # Vaciar lo que quedo en el resampler
+            chunks.extend(out.to_ndarray()[0] for out in resampler.resample(None))
+    except (av.error.InvalidDataError, av.error.OSError) as e:
+        # La entrada es un buffer en memoria: un error de I/O solo puede venir de un archivo cortado
+        raise InvalidAudioError(f"Could not decode uploaded audio: {e.strerror}") from e
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(chunks).astype(np.float32, copy=False)
+
+
+def decode_audio_ffmpeg(data: bytes) -> np.ndarray:
+    from transformers.pipelines.audio_utils import ffmpeg_read
+
+    return ffmpeg_read(data, SAMPLE_RATE)
+
+
+DECODERS = {
+    "pyav": decode_audio_pyav,
+    "ffmpeg": decode_audio_ffmpeg,
+}
+if STT_DECODER not in DECODERS:
+    raise ValueError(f"Unknown STT_DECODER: {STT_DECODER}")
+
+
+def decode_audio(data: bytes) -> np.ndarray:
+    return DECODERS[STT_DECODER](data)
+
+
+def frame_levels_db(audio: np.ndarray, frame_ms: float = 30) -> np.ndarray:
+    frame = int(SAMPLE_RATE * frame_ms / 1000)
+    frames = audio[: len(audio) // frame * frame].reshape(-1, frame)
+    rms = np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+    return 20 * np.log10(rms + 1e-10)
+
+
+VAD_FRAME_MS = 30
+
+
+def detect_speech(audio: np.ndarray) -> tuple:
+    """Recorta el silencio inicial y final por energia de frames de 30 ms.
+
+    Devuelve (audio recortado, info). Si hay menos de STT_VAD_MIN_SPEECH_MS de frames
+    por encima de STT_SILENCE_THRESHOLD_DB, info["speech"] es False y no vale la pena
+    correr Whisper: con ruido o silencio solo produce alucinaciones ("Gracias", ...).
+    """
+    duration_ms = len(audio) / SAMPLE_RATE * 1000
+    frame = int(SAMPLE_RATE * VAD_FRAME_MS / 1000)
+    speech_frames = np.flatnonzero(frame_levels_db(audio, VAD_FRAME_MS) > STT_SILENCE_THRESHOLD_DB)
+
+    if len(speech_frames) * VAD_FRAME_MS < STT_VAD_MIN_SPEECH_MS:
+        return audio[:0], {"speech": False, "duration_ms": duration_ms, "skipped_ms": duration_ms}
+
+    pad = int(SAMPLE_RATE * STT_VAD_PAD_MS / 1000)
+    start = max(0, speech_frames[0] * frame - pad)
+    end = min(len(audio), (speech_frames[-1] + 1) * frame + pad)
+    trimmed = audio[start:end]
+    return trimmed, {
+        "speech": True,
+        "duration_ms": duration_ms,
+        "skipped_ms": duration_ms - len(trimmed) / SAMPLE_RATE * 1000,
+    }
+
+
+def prepare_audio(data) -> tuple:
+    # data: bytes del upload o un array ya decodificado (streaming)
+    if isinstance(data, bytes):
+        with stage("decode"):
+            audio = decode_audio(data)
+    else:
+        audio = data
+    if not STT_VAD:
+        duration_ms = len(audio) / SAMPLE_RATE * 1000
+        return audio, {"speech": len(audio) > 0, "duration_ms": duration_ms, "skipped_ms": 0.0}
+    with stage("vad"):
+        return detect_speech(audio)
+
+
+class BatchStats:
+    def __init__(self, window: int = 1000):
+        self.total_batches = 0
+        self.total_requests = 0
+        self.sizes = deque(maxlen=window)
+        self.latencies_ms = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, size: int, latency_ms: float):
+        with self.lock:
+            self.total_batches += 1
+            self.total_requests += size
+            self.sizes.append(size)
+            self.latencies_ms.append(latency_ms)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            sizes = list(self.sizes)
+            latencies = sorted(self.latencies_ms)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            "total_batches": self.total_batches,
+            "total_requests": self.total_requests,
+            "mean_batch_size": sum(sizes) / len(sizes) if sizes else 0.0,
+            "latency_ms_p50": percentile(0.50),
+            "latency_ms_p95": percentile(0.95),
+            "latency_ms_max": latencies[-1] if latencies else 0.0,
+        }
+
+
+class VadStats:
+    def __init__(self):
+        self.clips = 0
+        self.clips_without_speech = 0
+        self.audio_ms = 0.0
+        self.skipped_ms = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, vad: dict):
+        with self.lock:
+            self.clips += 1
+            self.clips_without_speech += not vad["speech"]
+            self.audio_ms += vad["duration_ms"]
+            self.skipped_ms += vad["skipped_ms"]
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": STT_VAD,
+            "clips": self.clips,
+            "clips_without_speech": self.clips_without_speech,
+            "audio_seconds": self.audio_ms / 1000,
+            "skipped_seconds": self.skipped_ms / 1000,
+            "skipped_ratio": self.skipped_ms / self.audio_ms if self.audio_ms else 0.0,
+        }
+
+
+class CommandStats:
+    def __init__(self):
+        self.requests = 0
+        self.early_exits = 0
+        self.decoder_steps = 0
+        self.lock = threading.Lock()
+
+    def record(self, decoder: dict):
+        with self.lock:
+            self.requests += 1
+            self.early_exits += decoder["early_exit"]
+            self.decoder_steps += decoder["steps"]
+
+    def snapshot(self) -> dict:
+        return {
+            "requests": self.requests,
+            "early_exits": self.early_exits,
+            "mean_decoder_steps": self.decoder_steps / self.requests if self.requests else 0.0,
+        }
+
+
+class TranscriptionJob:
+    """Un pedido en la cola; guarda el contexto del request (ID y etapas) para que el
+    worker registre sus tiempos en ese mismo pedido."""
+
+    def __init__(self, data, mode: str):
+        self.future = Future()
+        self.data = data
+        self.mode = mode
+        self.context = contextvars.copy_context()
+        self.submitted = time.perf_counter()
+
+    def observe(self, name: str, seconds: float):
+        self.context.run(observe_stage, name, seconds)
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class InferenceWorkers:
+    """Carga el modelo una sola vez y lo comparte entre N hilos de inferencia que
+    consumen de una cola acotada. El event loop solo encola y espera.
+
+    Con batching, cada worker toma el primer pedido y espera hasta max_wait_ms por
+    mas (hasta max_batch_size) antes de correr un unico generate para todos. Los pedidos
+    en modo "command" no se agrupan: usan su propio generate con corte temprano.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        queue_size: int,
+        batching: bool = False,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10,
+    ):
+        self.workers = max(1, workers)
+        self.batching = batching
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.stats = BatchStats()
+        self.vad_stats = VadStats()
+        self.command_stats = CommandStats()
+        self.jobs = queue.Queue(maxsize=max(1, queue_size))
+        self.ready = threading.Event()
+        self.error = None
+        # Segundos por fase del arranque: import, import_models, load, warmup
+        self.phases = {"import": round(IMPORT_SECONDS, 3)}
+        self.backend = None
+        self.busy = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self._load, name="stt-loader", daemon=True).start()
+
+    def _phase(self, name: str, start: float):
+        self.phases[name] = round(time.perf_counter() - start, 3)
+        print(f" Arranque {name}: {self.phases[name]:.2f}s")
+
+    def load_model(self):
+        start = time.perf_counter()
+        from backends import load_backend
+        self._phase("import_models", start)
+
+        start = time.perf_counter()
+        self.backend = load_backend(STT_BACKEND, MODEL_PATH, device=DEVICE, workers=self.workers)
+        self._phase("load", start)
+
+    def _load(self):
+        try:
+            # Repartir los hilos de torch entre los workers en vez de que compitan
+            torch.set_num_threads(max(1, (os.cpu_count() or 1) // self.workers))
+            if self.backend is None:
+                self.load_model()
+
+            # Warm-up: la primera inferencia es mucho mas lenta que las siguientes
+            start = time.perf_counter()
+            self.backend.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), GENERATE_KWARGS)
+            self._phase("warmup", start)
+        except Exception as e:
+            self.error = str(e)
+            print(f"Error cargando el modelo: {e}")
+            return
+
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"stt-worker-{i}", daemon=True).start()
+        self.ready.set()
+        print(" Modelo listo para recibir pedidos.")
+
+    def submit(self, data, mode: str = "text") -> Future:
+        job = TranscriptionJob(data, mode)
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            raise QueueFullError("Speech-to-text queue is full, retry later")
+        # Se actualiza aca y no en /metrics, que con varios workers lo atiende uno solo
+        QUEUE_DEPTH.set(self.jobs.qsize())
+        return job.future
+
+    def _next_batch(self) -> list:
+        batch = [self.jobs.get()]
+        if self.batching:
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.jobs.get(timeout=timeout))
+                except queue.Empty:
+                    break
+        QUEUE_DEPTH.set(self.jobs.qsize())
+        # Si el request ya expiro y cancelo el future, no se procesa
+        return [job for job in batch if job.future.set_running_or_notify_cancel()]
 
-        return jsonify({
-            "text": text,
-            "language": "es-AR"
+    def _prepare(self, batch: list) -> list:
+        """Decodifica y pasa el VAD; los clips sin voz se responden sin usar el modelo."""
+        ready = []
+        for job in batch:
+            job.observe("queue_wait", time.perf_counter() - job.submitted)
+            try:
+                audio, vad = job.context.run(prepare_audio, job.data)
+            except Exception as e:
+                job.future.set_exception(e)
+                continue
+            self.vad_stats.record(vad)
+            CLIPS.labels(str(vad["speech"]).lower()).inc()
+            VAD_SKIPPED_SECONDS.inc(vad["skipped_ms"] / 1000)
+            if vad["speech"]:
+                ready.append((job, audio, vad))
+            elif job.mode == "command":
+                job.future.set_result({"text": "", "vad": vad, "command": match_command("")})
+            else:
+                job.future.set_result({"text": "", "vad": vad})
+        return ready
+
+    def _run_batch(self, ready: list):
+        start = time.perf_counter()
+        try:
+            texts = self.backend.transcribe_batch([audio for _, audio, _ in ready])
+        except Exception as e:
+            for job, _, _ in ready:
+                job.future.set_exception(e)
+            return
+        latency = time.perf_counter() - start
+        self.stats.record(len(ready), latency * 1000)
+        BATCH_SIZE.observe(len(ready))
+        request_ids = ",".join(job.context.get(request_id_var) for job, _, _ in ready)
+        print(f"STT batch: size={len(ready)} latency={latency * 1000:.1f}ms requests={request_ids}")
+        for (job, _, vad), text in zip(ready, texts):
+            job.observe("generate", latency)
+            job.future.set_result({"text": text, "vad": vad})
+
+    def _run_single(self, job: TranscriptionJob, audio: np.ndarray, vad: dict):
+        start = time.perf_counter()
+        try:
+            text = self.backend.transcribe(audio, GENERATE_KWARGS)
+        except Exception as e:
+            job.future.set_exception(e)
+            return
+        job.observe("generate", time.perf_counter() - start)
+        job.future.set_result({"text": text, "vad": vad})
+
+    def _run_command(self, job: TranscriptionJob, audio: np.ndarray, vad: dict):
+        start = time.perf_counter()
+        try:
+            result = self.backend.transcribe_command(audio)
+        except Exception as e:
+            job.future.set_exception(e)
+            return
+        job.observe("generate", time.perf_counter() - start)
+        decoder = {"steps": result["steps"], "early_exit": result["early_exit"]}
+        self.command_stats.record(decoder)
+        COMMAND_REQUESTS.labels(str(decoder["early_exit"]).lower()).inc()
+        job.future.set_result({
+            "text": result["text"],
+            "vad": vad,
+            "command": match_command(result["text"]),
+            "decoder": decoder,
         })
 
+    def _work(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            with self.lock:
+                self.busy += 1
+                WORKERS_BUSY.set(self.busy)
+            try:
+                ready = self._prepare(batch)
+                for job, audio, vad in ready:
+                    if job.mode == "command":
+                        self._run_command(job, audio, vad)
+                ready = [item for item in ready if item[0].mode != "command"]
+                if not ready:
+                    continue
+                if self.batching:
+                    self._run_batch(ready)
+                else:
+                    self._run_single(*ready[0])
+            finally:
+                with self.lock:
+                    self.busy -= 1
+                    WORKERS_BUSY.set(self.busy)
+
+    def startup_snapshot(self) -> dict:
+        status = "ready" if self.ready.is_set() else "error" if self.error else "loading"
+        return {"status": status, "error": self.error, "phases_s": dict(self.phases)}
+
+    def snapshot(self) -> dict:
+        return {
+            "workers": self.workers,
+            "busy": self.busy,
+            "queued": self.jobs.qsize(),
+            "queue_size": self.jobs.maxsize,
+        }
+
+
+inference_workers = InferenceWorkers(
+    STT_WORKERS,
+    STT_QUEUE_SIZE,
+    batching=STT_BATCHING,
+    max_batch_size=STT_BATCH_MAX_SIZE,
+    max_wait_ms=STT_BATCH_MAX_WAIT_MS,
+)
+
+
+if STT_PRELOAD_MODEL:
+    if STT_BACKEND == "ctranslate2":
+        # CTranslate2 arranca sus hilos al crear el modelo y no sobreviven al fork
+        print(" STT_PRELOAD_MODEL no aplica a ctranslate2: cada worker carga su modelo.")
+    else:
+        # Los workers heredan los pesos por fork (copy-on-write); el warm-up es por worker
+        inference_workers.load_model()
+
+
+@app.on_event("startup")
+async def load_model():
+    inference_workers.start()
+
+
+@app.get('/health')
+async def health():
+    # Solo se reporta listo cuando el modelo ya esta cargado y "caliente"
+    if not inference_workers.ready.is_set():
+        status = "error" if inference_workers.error else "loading"
+        return JSONResponse(
+            {"status": status, "service": "whisper-argentino-api", "error": inference_workers.error},
+            status_code=503,
+        )
+    return {"status": "ok", "service": "whisper-argentino-api", **inference_workers.snapshot()}
+
+
+@app.get('/ready')
+async def ready():
+    # Mismo criterio que /health, con los tiempos por fase del arranque
+    snapshot = inference_workers.startup_snapshot()
+    return JSONResponse(snapshot, status_code=200 if inference_workers.ready.is_set() else 503)
+
+
+async def run_inference(data, mode: str = "text") -> dict:
+    """Encola un pedido en los workers y espera {"text", "vad"} con timeout.
+
+    En modo "command" el resultado trae tambien la intencion ("command") y los pasos
+    del decoder.
+    """
+    future = inference_workers.submit(data, mode)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), STT_REQUEST_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        future.cancel()
+        raise
+
+
+@app.post('/transcribe')
+async def transcribe(file: UploadFile = File(None), mode: str = Query("text")):
+    if mode not in ("text", "command"):
+        return JSONResponse({"error": f"Unknown mode: {mode}"}, status_code=400)
+    if file is None:
+        return JSONResponse({"error": "No file part"}, status_code=400)
+    if file.filename == '':
+        return JSONResponse({"error": "No selected file"}, status_code=400)
+    if not inference_workers.ready.is_set():
+        return JSONResponse({"error": "Model is still loading"}, status_code=503)
+
+    with stage("upload_read"):
+        data = await file.read()
+    if not data:
+        return JSONResponse({"error": "Empty file"}, status_code=400)
+
+    try:
+        result = await run_inference(data, mode)
+    except InvalidAudioError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except QueueFullError as e:
+        return JSONResponse({"error": str(e)}, status_code=429, headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        return JSONResponse({"error": "Transcription timed out"}, status_code=504)
     except Exception as e:
         print(f"Error: {e}")
-        return jsonify({"error": str(e)}), 500
-    
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+    text = result["text"]
+    if result["vad"]["speech"]:
+        print(f" [{request_id_var.get()}] Rápido: '{text}'")
+    else:
+        print(f" [{request_id_var.get()}] Sin voz, se omitio el modelo.")
+
+    response = {
+        "text": text,
+        "language": "es-AR",
+        "speech": result["vad"]["speech"],
+        "skipped_ms": round(result["vad"]["skipped_ms"]),
+    }
+    if mode == "command":
+        response["command"] = result["command"]
+        response["decoder"] = result.get("decoder", {"steps": 0, "early_exit": False})
+    return response
+
+
+class StreamingSession:
+    """Audio acumulado de una sesion de streaming y reglas de cuando emitir un
+    parcial (cada STT_STREAM_STEP_MS de audio nuevo) o cerrar la frase (silencio
+    final de STT_STREAM_ENDPOINT_MS despues de haber escuchado voz)."""
+
+    FRAME_MS = 30
+
+    def __init__(self):
+        self.window_samples = int(STT_STREAM_WINDOW_SECONDS * SAMPLE_RATE)
+        self.step_samples = int(STT_STREAM_STEP_MS / 1000 * SAMPLE_RATE)
+        self.endpoint_frames = max(1, int(STT_STREAM_ENDPOINT_MS / self.FRAME_MS))
+        self.max_samples = int(STT_STREAM_MAX_SECONDS * SAMPLE_RATE)
+        self.reset()
+
+    def reset(self):
+        self.chunks = []
+        self.samples = 0
+        self.since_partial = 0
+        self.heard_speech = False
+        self.trailing_silence = 0
+        self.pending = np.zeros(0, dtype=np.float32)
+
+    def append(self, audio: np.ndarray):
+        self.chunks.append(audio)
+        self.samples += len(audio)
+        self.since_partial += len(audio)
+
+        # El VAD por energia mira frames completos; lo que sobra queda para el proximo chunk
+        audio = np.concatenate([self.pending, audio])
+        frame = int(SAMPLE_RATE * self.FRAME_MS / 1000)
+        usable = len(audio) // frame * frame
+        self.pending = audio[usable:]
+        for is_speech in frame_levels_db(audio[:usable], self.FRAME_MS) > STT_SILENCE_THRESHOLD_DB:
+            if is_speech:
+                self.heard_speech = True
+                self.trailing_silence = 0
+            else:
+                self.trailing_silence += 1
+
+    def audio(self) -> np.ndarray:
+        if len(self.chunks) > 1:
+            self.chunks = [np.concatenate(self.chunks)]
+        return self.chunks[0] if self.chunks else np.zeros(0, dtype=np.float32)
+
+    def window(self) -> np.ndarray:
+        return self.audio()[-self.window_samples:]
+
+    def partial_due(self) -> bool:
+        return self.heard_speech and self.since_partial >= self.step_samples
+
+    def endpoint_reason(self) -> Optional[str]:
+        if self.heard_speech and self.trailing_silence >= self.endpoint_frames:
+            return "endpoint"
+        if self.samples >= self.max_samples:
+            return "max_length"
+        return None
+
+
+def pcm_to_float(data: bytes, sample_format: str) -> np.ndarray:
+    width = 4 if sample_format == "f32" else 2
+    if len(data) % width:
+        raise ValueError(f"Binary frame of {len(data)} bytes is not a whole number of {width}-byte samples")
+    if sample_format == "f32":
+        return np.frombuffer(data, dtype="<f4").astype(np.float32)
+    return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+
+
+@app.websocket('/ws/transcribe')
+async def transcribe_stream(websocket: WebSocket, sample_format: str = Query("s16", alias="format")):
+    """Transcripcion incremental mientras el usuario sigue hablando.
+
+    El cliente manda frames binarios de audio mono 16 kHz (PCM int16 little-endian,
+    o float32 con ?format=f32) y {"event": "end"} al soltar la tecla. El servidor
+    responde {"type": "partial", "text"} a medida que llega audio y
+    {"type": "final", "text", "reason"} al detectar el final de la frase o al
+    recibir "end". La conexion queda abierta para la siguiente frase. Un frame que no
+    tiene un numero entero de muestras se responde con un error y cierre 1003.
+    """
+    # Las conexiones WebSocket no pasan por el middleware HTTP: el request ID se toma aca
+    request_id_var.set(websocket.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex)
+    await websocket.accept()
+    if not inference_workers.ready.is_set():
+        await websocket.send_json({"type": "error", "error": "Model is still loading"})
+        await websocket.close(code=1013)
+        return
+
+    session = StreamingSession()
+    partial_task = None
+
+    async def send_partial(audio: np.ndarray):
+        try:
+            text = (await run_inference(audio))["text"]
+        except (QueueFullError, asyncio.TimeoutError):
+            # Un parcial perdido no es grave: el siguiente o el final lo cubren
+            return
+        await websocket.send_json({"type": "partial", "text": text})
+
+    async def finalize(reason: str):
+        nonlocal partial_task
+        if partial_task is not None and not partial_task.done():
+            partial_task.cancel()
+        partial_task = None
+
+        # La frase completa (acotada por STT_STREAM_MAX_SECONDS), no solo la ventana
+        audio = session.audio()
+        session.reset()
+        if not len(audio):
+            await websocket.send_json({"type": "final", "text": "", "reason": reason})
+            return
+        try:
+            text = (await run_inference(audio))["text"]
+        except (QueueFullError, asyncio.TimeoutError) as e:
+            await websocket.send_json({"type": "error", "error": str(e) or "Transcription timed out"})
+            return
+        print(f" Streaming ({reason}): '{text}'")
+        await websocket.send_json({"type": "final", "text": text, "reason": reason})
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            if message.get("bytes") is not None:
+                try:
+                    audio = pcm_to_float(message["bytes"], sample_format)
+                except ValueError as e:
+                    # Frame cortado o formato equivocado: 1003 (unsupported data) en vez de traceback
+                    await websocket.send_json({"type": "error", "error": str(e)})
+                    await websocket.close(code=1003)
+                    break
+                session.append(audio)
+                reason = session.endpoint_reason()
+                if reason:
+                    await finalize(reason)
+                elif session.partial_due() and (partial_task is None or partial_task.done()):
+                    session.since_partial = 0
+                    partial_task = asyncio.create_task(send_partial(session.window()))
+            elif message.get("text") is not None:
+                try:
+                    event = json.loads(message["text"]).get("event")
+                except (ValueError, AttributeError):
+                    event = None
+                if event == "end":
+                    await finalize("end")
+    except WebSocketDisconnect:
+        pass
     finally:
-        if os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except:
-                pass
+        if partial_task is not None and not partial_task.done():
+            partial_task.cancel()
+
+
+@app.get('/metrics')
+async def metrics():
+    return metrics_response()
+
+
+@app.get('/stats')
+async def stats():
+    return {
+        "startup": inference_workers.startup_snapshot(),
+        "memory": workers_memory() if STT_PRELOAD_MODEL else process_memory(),
+        "backend": STT_BACKEND,
+        "workers": inference_workers.snapshot(),
+        "vad": inference_workers.vad_stats.snapshot(),
+        "commands": inference_workers.command_stats.snapshot(),
+        "batching": {
+            "enabled": inference_workers.batching,
+            "max_batch_size": inference_workers.max_batch_size,
+            "max_wait_ms": inference_workers.max_wait * 1000,
+            **inference_workers.stats.snapshot(),
+        },
+    }
+
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv("PORT", "5000")))
@@ -0,0 +1,50 @@
+"""Memoria por proceso leida de /proc (solo Linux).
+
+Con varios workers de gunicorn y el modelo precargado en el master, la RSS de cada
+worker cuenta las paginas compartidas con los demas; PSS las reparte entre todos, asi
+que la suma de PSS es la memoria real del nodo.
+"""
+import os
+
+
+def process_memory(pid=None) -> dict:
+    """RSS, PSS, compartida y privada en MB (vacio si /proc no esta disponible)."""
+    pid = pid or os.getpid()
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        return {}
+
+    def mb(*names: str) -> float:
+        return round(sum(fields.get(name, 0) for name in names) / 1024, 1)
+
+    return {
+        "pid": pid,
+        "rss_mb": mb("Rss"),
+        "pss_mb": mb("Pss"),
+        "shared_mb": mb("Shared_Clean", "Shared_Dirty"),
+        "private_mb": mb("Private_Clean", "Private_Dirty"),
+    }
+
+
+def workers_memory() -> dict:
+    """Memoria del master de gunicorn (el padre) y de todos sus workers."""
+    master = os.getppid()
+    try:
+        with open(f"/proc/{master}/task/{master}/children") as f:
+            pids = [int(pid) for pid in f.read().split()]
+    except OSError:
+        pids = []
+    processes = [process_memory(master)] + [process_memory(pid) for pid in pids]
+    processes = [p for p in processes if p]
+    return {
+        "master": processes[0] if processes else {},
+        "workers": processes[1:],
+        "total_rss_mb": round(sum(p["rss_mb"] for p in processes), 1),
+        "total_pss_mb": round(sum(p["pss_mb"] for p in processes), 1),
+    }
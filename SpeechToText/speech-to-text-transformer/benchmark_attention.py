@@ -0,0 +1,106 @@
+"""Micro-benchmark de atencion: SelfAttentionLayer (calculate_attention) vs MultiHeadAttention (SDPA).
+
+"fused1" es MultiHeadAttention con una cabeza, asi el speedup contra "single" compara solo
+el kernel con la misma cantidad de cabezas; "fused" usa --heads cabezas.
+
+Mide forward + backward con key-padding mask para largos de secuencia hasta
+max_seq_length=2000. Cada medicion corre en un proceso nuevo, asi el pico de memoria
+(memoria del device en CUDA, RSS maximo en CPU) no arrastra lo de mediciones anteriores:
+
+    python benchmark_attention.py --lengths 250 500 1000 2000 --embed-size 64 --heads 4
+"""
+
+import argparse
+import multiprocessing
+import resource
+import time
+
+import torch
+
+from self_attention import MultiHeadAttention, SelfAttentionLayer
+
+KINDS = ("single", "fused1", "fused")
+
+def build_layer(kind, embed_size, num_heads):
+  if kind == "single":
+    return SelfAttentionLayer(embed_size)
+  if kind == "fused1":
+    return MultiHeadAttention(embed_size, 1)
+  return MultiHeadAttention(embed_size, num_heads)
+
+def peak_memory_mb(device):
+  if device.type == "cuda":
+    return torch.cuda.max_memory_allocated(device) / 2**20
+  # ru_maxrss esta en KB en Linux
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure(kind, sequence_length, args, results):
+  device = torch.device(args.device)
+  torch.manual_seed(0)
+  layer = build_layer(kind, args.embed_size, args.heads).to(device)
+  x = torch.randn(args.batch_size, sequence_length, args.embed_size, device=device, requires_grad=True)
+  # La mitad del batch con 3/4 del largo, como despues del padding de collate_fn
+  lengths = torch.full((args.batch_size,), sequence_length, device=device)
+  lengths[args.batch_size // 2:] = sequence_length * 3 // 4
+  key_padding_mask = torch.arange(sequence_length, device=device)[None, :] >= lengths[:, None]
+
+  def step():
+    layer(x, key_padding_mask).sum().backward()
+    if device.type == "cuda":
+      torch.cuda.synchronize(device)
+
+  if device.type == "cuda":
+    torch.cuda.reset_peak_memory_stats(device)
+    baseline_mb = torch.cuda.memory_allocated(device) / 2**20
+  else:
+    baseline_mb = peak_memory_mb(device)
+  step()
+  memory_mb = peak_memory_mb(device) - baseline_mb
+
+  start = time.perf_counter()
+  for _ in range(args.repeats):
+    step()
+  results.put((kind, sequence_length, (time.perf_counter() - start) / args.repeats * 1000, memory_mb))
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--lengths", type=int, nargs="+", default=[250, 500, 1000, 2000])
+  parser.add_argument("--batch-size", type=int, default=8)
+  parser.add_argument("--embed-size", type=int, default=64)
+  parser.add_argument("--heads", type=int, default=4)
+  parser.add_argument("--repeats", type=int, default=10)
+  parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+  args = parser.parse_args()
+
+  context = multiprocessing.get_context("spawn")
+  results = context.SimpleQueue()
+  rows = {}
+  for sequence_length in args.lengths:
+    for kind in KINDS:
+      process = context.Process(target=measure, args=(kind, sequence_length, args, results))
+      process.start()
+      process.join()
+      if process.exitcode != 0:
+        raise SystemExit(f"{kind} attention failed at length {sequence_length}")
+      kind, _, ms, memory_mb = results.get()
+      rows[kind, sequence_length] = (ms, memory_mb)
+
+  memory_label = "MB pico" if args.device.startswith("cuda") else "MB RSS"
+  print(
+      f"{args.device}, batch {args.batch_size}, embed {args.embed_size}, fused con 1 y {args.heads} cabezas, "
+      "forward + backward con key-padding mask\n"
+  )
+  # speedup: single / fused1 (mismo numero de cabezas, solo cambia el kernel)
+  print(
+      f"{'largo':>6} {'single ms':>10} {'fused1 ms':>10} {'speedup':>8} {'fused ms':>9} "
+      + " ".join(f"{kind + ' ' + memory_label:>{len(kind) + 8}}" for kind in KINDS)
+  )
+  for sequence_length in args.lengths:
+    (single_ms, _), (fused1_ms, _), (fused_ms, _) = (rows[kind, sequence_length] for kind in KINDS)
+    print(
+        f"{sequence_length:>6} {single_ms:>10.2f} {fused1_ms:>10.2f} {single_ms / fused1_ms:>7.2f}x {fused_ms:>9.2f} "
+        + " ".join(f"{rows[kind, sequence_length][1]:>{len(kind) + 8}.1f}" for kind in KINDS)
+    )
+
+if __name__ == "__main__":
+  main()
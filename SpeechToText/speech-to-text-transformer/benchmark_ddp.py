@@ -0,0 +1,92 @@
+"""Benchmark de escalado de train.py con DDP (gloo, CPU): samples/s con 1, 2, 4 y 8 procesos.
+
+Cada proceso entrena el modelo de train.py con batches sinteticos del mismo tamano
+(escalado debil), asi se mide el computo mas el all_reduce de gradientes y no la carga
+de datos. Los cores se reparten entre los procesos para no sobresuscribir la CPU:
+
+    python benchmark_ddp.py --processes 1 2 4 8 --steps 30
+
+Para entrenar con varios procesos: `torchrun --nproc-per-node 4 train.py` (o con
+--nnodes/--rdzv-endpoint para varios nodos).
+"""
+
+import argparse
+import os
+import socket
+import time
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+
+from training import LEARNING_RATE, create_model, run_loss_function
+
+def free_port():
+  with socket.socket() as sock:
+    sock.bind(("127.0.0.1", 0))
+    return sock.getsockname()[1]
+
+def worker(rank, world_size, port, args, results):
+  os.environ["MASTER_ADDR"] = "127.0.0.1"
+  os.environ["MASTER_PORT"] = str(port)
+  torch.set_num_threads(max(1, args.threads // world_size))
+  dist.init_process_group("gloo", rank=rank, world_size=world_size)
+
+  torch.manual_seed(rank)
+  # Igual que train.py: output_layer congelado y DDP sin find_unused_parameters
+  model = create_model(args.vocab_size)
+  model.output_layer.requires_grad_(False)
+  model = DistributedDataParallel(model)
+  optimizer = torch.optim.Adam(model.parameters(), lr=LEARNING_RATE)
+  audio = torch.randn(args.batch_size, int(args.audio_seconds * args.sample_rate))
+  # Ids dentro de las clases que devuelve el forward (la CTC no valida el rango)
+  with torch.no_grad():
+    num_classes = model.module(audio[:1])[0].shape[-1]
+  target = torch.randint(1, num_classes, (args.batch_size, args.target_length))
+
+  for step in range(args.warmup + args.steps):
+    if step == args.warmup:
+      dist.barrier()
+      start = time.perf_counter()
+    optimizer.zero_grad(set_to_none=True)
+    output, vq_loss = model(audio)
+    loss = run_loss_function(output, target, 0, zero_infinity=True) + vq_loss
+    loss.backward()
+    optimizer.step()
+  dist.barrier()
+  elapsed = time.perf_counter() - start
+
+  if rank == 0:
+    results.put((world_size, args.steps * args.batch_size * world_size / elapsed))
+  dist.destroy_process_group()
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, 8])
+  parser.add_argument("--steps", type=int, default=30)
+  parser.add_argument("--warmup", type=int, default=3)
+  parser.add_argument("--batch-size", type=int, default=16, help="Batch por proceso")
+  parser.add_argument("--audio-seconds", type=float, default=4.0)
+  parser.add_argument("--sample-rate", type=int, default=48000)
+  parser.add_argument("--target-length", type=int, default=20)
+  parser.add_argument("--vocab-size", type=int, default=36)
+  parser.add_argument("--threads", type=int, default=os.cpu_count(), help="Threads totales a repartir")
+  args = parser.parse_args()
+
+  context = mp.get_context("spawn")
+  results = context.SimpleQueue()
+  rows = []
+  for world_size in args.processes:
+    mp.spawn(worker, args=(world_size, free_port(), args, results), nprocs=world_size)
+    rows.append(results.get())
+
+  baseline = rows[0][1]
+  print(f"{args.threads} threads, batch {args.batch_size} por proceso, {args.audio_seconds:g} s de audio\n")
+  print(f"{'procesos':>8} {'samples/s':>10} {'speedup':>8} {'eficiencia':>11}")
+  for world_size, samples_per_sec in rows:
+    speedup = samples_per_sec / baseline
+    print(f"{world_size:>8} {samples_per_sec:>10.1f} {speedup:>7.2f}x {speedup * rows[0][0] / world_size:>10.0%}")
+
+if __name__ == "__main__":
+  main()
@@ -17,7 +17,11 @@ import torchcodec
 from torch.utils.data import Dataset, DataLoader
 from torchaudio.transforms import MelSpectrogram
 import torch.nn.functional as F
-from datasets import load_dataset, concatenate_datasets
+import numpy as np
+from torch.utils.data import Sampler
+from torch.utils.data.distributed import DistributedSampler
+from datasets import Audio, load_dataset, concatenate_datasets
+from shards import ShardedDataset
 
 def get_tokenizer(save_path="tokenizer.json"):
   tokenizer = Tokenizer(models.BPE())
@@ -42,6 +46,8 @@ def collate_fn(batch):
 
   output_dict = {
       "audio": audio_tensor,
+      # Largo real de cada clip antes del padding (para los input_lengths de la CTC)
+      "audio_lengths": torch.tensor([item["audio"].shape[0] for item in batch]),
       "text": [item["text"] for item in batch]
   }
 
@@ -89,12 +95,113 @@ class CommonVoiceDataset(Dataset):
 
     return {"audio": waveform, "text": text}
 
-def get_dataset(batch_size=32, num_examples=None, num_workers=4):
+  def lengths(self):
+    # Decodifica cada clip una vez; con ShardedDataset el largo sale del indice
+    return [len(self.dataset[idx]["audio"]["array"]) for idx in range(self.num_examples)]
+
+class LengthBucketBatchSampler(Sampler):
+  """Arma batches con clips de largo parecido para que collate_fn agregue poco padding.
+
+  Mezcla los indices, los agrupa en buckets de batch_size * bucket_factor, ordena cada
+  bucket por largo y lo corta en batches; despues mezcla el orden de los batches. Con
+  max_batch_samples el corte es por presupuesto (clips * largo maximo del batch, en
+  muestras de audio) en lugar de una cantidad fija de clips.
+
+  Con num_replicas > 1 (DDP) todos los procesos arman los mismos batches con la misma
+  semilla y cada uno se queda con batches[rank::num_replicas], recortados para que todos
+  hagan la misma cantidad de pasos.
+  """
+
+  def __init__(
+      self,
+      lengths,
+      batch_size,
+      max_batch_samples=None,
+      bucket_factor=50,
+      shuffle=True,
+      seed=0,
+      num_replicas=1,
+      rank=0,
+  ):
+    self.lengths = np.asarray(lengths)
+    self.batch_size = batch_size
+    self.max_batch_samples = max_batch_samples
+    self.bucket_factor = bucket_factor
+    self.shuffle = shuffle
+    self.seed = seed
+    self.num_replicas = num_replicas
+    self.rank = rank
+    self.epoch = 0
+
+  def set_epoch(self, epoch):
+    self.epoch = epoch
+
+  def batches(self):
+    rng = np.random.default_rng(self.seed + self.epoch)
+    indices = rng.permutation(len(self.lengths)) if self.shuffle else np.arange(len(self.lengths))
+    bucket_size = self.batch_size * self.bucket_factor
+    batches = []
+    for start in range(0, len(indices), bucket_size):
+      bucket = indices[start:start + bucket_size]
+      bucket = bucket[np.argsort(self.lengths[bucket], kind="stable")]
+      batches.extend(self._split(bucket))
+    if self.shuffle:
+      rng.shuffle(batches)
+    if self.num_replicas > 1:
+      per_replica = len(batches) // self.num_replicas
+      batches = batches[self.rank::self.num_replicas][:per_replica]
+    return batches
+
+  def _split(self, bucket):
+    if self.max_batch_samples is None:
+      return [bucket[i:i + self.batch_size].tolist() for i in range(0, len(bucket), self.batch_size)]
+    # El bucket esta ordenado de menor a mayor: el clip que entra es el mas largo del batch
+    batches, batch = [], []
+    for idx in bucket.tolist():
+      if batch and (len(batch) + 1) * self.lengths[idx] > self.max_batch_samples:
+        batches.append(batch)
+        batch = []
+      batch.append(idx)
+    if batch:
+      batches.append(batch)
+    return batches
+
+  def __iter__(self):
+    batches = self.batches()
+    self.epoch += 1
+    return iter(batches)
+
+  def __len__(self):
+    if self.max_batch_samples is None:
+      bucket_size = self.batch_size * self.bucket_factor
+      full, rest = divmod(len(self.lengths), bucket_size)
+      return (full * self.bucket_factor + -(-rest // self.batch_size)) // self.num_replicas
+    return len(self.batches())
+
+def padding_ratio(batches, lengths):
+  """Fraccion del audio de los batches que es padding de collate_fn."""
+  lengths = np.asarray(lengths)
+  real = sum(int(lengths[batch].sum()) for batch in batches)
+  padded = sum(int(lengths[batch].max()) * len(batch) for batch in batches)
+  return 1 - real / padded if padded else 0.0
+
+def report_padding(lengths, batch_size, max_batch_samples=None):
+  lengths = np.asarray(lengths)
+  order = np.random.default_rng(0).permutation(len(lengths))
+  shuffled = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+  bucketed = LengthBucketBatchSampler(lengths, batch_size, max_batch_samples=max_batch_samples).batches()
+  before = padding_ratio(shuffled, lengths)
+  after = padding_ratio(bucketed, lengths)
+  print(f"Padding con shuffle: {before:.1%} ({len(shuffled)} batches)")
+  print(f"Padding con buckets por largo: {after:.1%} ({len(bucketed)} batches)")
+  return before, after
+
+def load_source_dataset(sample_rate=None):
   dataset_f = load_dataset("ylacombe/google-argentinian-spanish", "female")
   dataset_m = load_dataset("ylacombe/google-argentinian-spanish", "male")
   dataset = concatenate_datasets([dataset_f["train"], dataset_m["train"]])
-
-  tokenizer = get_tokenizer()
+  if sample_rate is not None:
+    dataset = dataset.cast_column("audio", Audio(sampling_rate=sample_rate))
 
   def clean_text(batch):
       text = batch["text"]
@@ -106,14 +213,60 @@ def get_dataset(batch_size=32, num_examples=None, num_workers=4):
       batch["text"] = text
       return batch
 
-  dataset = dataset.map(clean_text)
-  dataset = CommonVoiceDataset(dataset, tokenizer=tokenizer, num_examples=num_examples)
+  return dataset.map(clean_text)
+
+def get_dataset(
+    batch_size=32,
+    num_examples=None,
+    num_workers=4,
+    shard_dir=None,
+    bucket_by_length=False,
+    max_batch_samples=None,
+    rank=0,
+    world_size=1,
+):
+  if shard_dir is not None:
+    # Shards generados con shards.py: sin dataset de HF ni tokenizer por item
+    dataset = ShardedDataset(shard_dir, num_examples=num_examples)
+  else:
+    dataset = CommonVoiceDataset(load_source_dataset(), tokenizer=get_tokenizer(), num_examples=num_examples)
+
+  if bucket_by_length:
+    batch_sampler = LengthBucketBatchSampler(
+        dataset.lengths(),
+        batch_size,
+        max_batch_samples=max_batch_samples,
+        num_replicas=world_size,
+        rank=rank,
+    )
+    dataloader = DataLoader(
+        dataset,
+        batch_sampler=batch_sampler,
+        collate_fn=collate_fn,
+        num_workers=num_workers,
+        persistent_workers=num_workers > 0,
+    )
+    return dataloader
 
-  dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=True, collate_fn=collate_fn, num_workers=num_workers)
+  # En DDP cada proceso ve una particion distinta del dataset (llamar a set_epoch por epoch)
+  sampler = DistributedSampler(dataset, num_replicas=world_size, rank=rank) if world_size > 1 else None
+  dataloader = DataLoader(
+      dataset,
+      batch_size=batch_size,
+      shuffle=sampler is None,
+      sampler=sampler,
+      collate_fn=collate_fn,
+      num_workers=num_workers,
+      persistent_workers=num_workers > 0,
+  )
   return dataloader
 
 if __name__ == "__main__":
-    dataloader = get_dataset(batch_size=32)
+    shard_dir = os.getenv("SHARD_DIR")
+    if shard_dir:
+        # Padding antes/despues de agrupar por largo, sin leer el audio
+        report_padding(ShardedDataset(shard_dir).lengths(), batch_size=64)
+    dataloader = get_dataset(batch_size=32, shard_dir=shard_dir)
     for batch in dataloader:
         audio = batch["audio"]
         input_ids = batch["speaker_id"]
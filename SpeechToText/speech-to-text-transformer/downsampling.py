@@ -58,6 +58,16 @@ class DownsamplingNetwork(nn.Module):
       )
     self.final_conv = nn.Conv1d(hidden_dim, embedding_dim, kernel_size=4, padding="same")
 
+  def output_lengths(self, lengths: torch.Tensor):
+    """Frames de salida para clips de `lengths` muestras (sin contar el padding del batch)."""
+    lengths = torch.div(lengths, self.mean_pooling.kernel_size, rounding_mode="floor")
+    for layer in self.layers:
+      # conv1 usa padding "same"; conv2 no tiene padding
+      kernel_size = layer.conv2.kernel_size[0]
+      stride = layer.conv2.stride[0]
+      lengths = torch.div(lengths - kernel_size, stride, rounding_mode="floor") + 1
+    return lengths
+
   def forward(self, x):
     x = self.mean_pooling(x)
     for layer in self.layers:
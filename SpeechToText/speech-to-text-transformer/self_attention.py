@@ -16,9 +16,13 @@ def calculate_attention(
     values: torch.Tensor,
     keys: torch.Tensor,
     query: torch.Tensor,
+    key_padding_mask: torch.Tensor = None,
 ):
   attention_scores = torch.matmul(query, keys.transpose(-2, -1))
   attention_scores = attention_scores / math.sqrt(keys.shape[-1])
+  if key_padding_mask is not None:
+    # key_padding_mask: (B, T), True en los frames de padding
+    attention_scores = attention_scores.masked_fill(key_padding_mask[:, None, :], float("-inf"))
   attention_scores = F.softmax(attention_scores, dim=-1)
   attention = torch.matmul(attention_scores, values)
   return attention, attention_scores
@@ -43,27 +47,46 @@ class SelfAttentionLayer(nn.Module):
     self.key_dense = nn.Linear(embed_size, embed_size)
     self.value_dense = nn.Linear(embed_size, embed_size)
 
-  def forward(self, embeddings: torch.Tensor):
+  def forward(self, embeddings: torch.Tensor, key_padding_mask: torch.Tensor = None):
     query = self.query_dense(embeddings)
     key = self.key_dense(embeddings)
     value = self.value_dense(embeddings)
-    attention, _ = calculate_attention(value, key, query)
+    attention, _ = calculate_attention(value, key, query, key_padding_mask)
     return attention
 
-#class MultiHeadAttention(nn.Module):
-#  def __init__(self, embed_size:int, num_heads:int):
-#    super().__init__()
-#    assert (
-#        embed_size % num_heads == 0
-#    ), "Embedding size must be divisible by number of heads"
-#
-#    self.embed_size = embed_size
-#    self.num_heads = num_heads
-#    self.head_dim = embed_size // num_heads
-#
-#    self.query = nn.Linear(embed_size, embed_size)
-#    self.key = nn.Linear(embed_size, embed_size)
-#    self.value = nn.Linear(embed_size, embed_size)
+class MultiHeadAttention(nn.Module):
+  """Atencion multi-head con una sola proyeccion QKV y scaled_dot_product_attention.
+
+  SDPA elige el kernel (flash / memory-efficient) y no materializa la matriz T x T de
+  scores cuando el kernel lo permite, a diferencia de calculate_attention.
+  """
+
+  def __init__(self, embed_size: int, num_heads: int):
+    super().__init__()
+    assert (
+        embed_size % num_heads == 0
+    ), "Embedding size must be divisible by number of heads"
+
+    self.embed_size = embed_size
+    self.num_heads = num_heads
+    self.head_dim = embed_size // num_heads
+
+    self.qkv = nn.Linear(embed_size, 3 * embed_size)
+    self.output = nn.Linear(embed_size, embed_size)
+
+  def forward(self, embeddings: torch.Tensor, key_padding_mask: torch.Tensor = None):
+    batch_size, sequence_length, _ = embeddings.shape
+    # (B, T, 3 * D) -> 3 x (B, H, T, D / H)
+    qkv = self.qkv(embeddings).view(batch_size, sequence_length, 3, self.num_heads, self.head_dim)
+    query, key, value = qkv.permute(2, 0, 3, 1, 4)
+
+    attn_mask = None
+    if key_padding_mask is not None:
+      # SDPA toma True como "se puede atender": se invierte y se expande a (B, 1, 1, T)
+      attn_mask = ~key_padding_mask[:, None, None, :]
+    attention = F.scaled_dot_product_attention(query, key, value, attn_mask=attn_mask)
+    attention = attention.transpose(1, 2).reshape(batch_size, sequence_length, self.embed_size)
+    return self.output(attention)
 
 class SinusoidalPositionEncoding(nn.Module):
   def __init__(self, embed_size: int, max_seq_length: int):
@@ -82,14 +105,18 @@ class SinusoidalPositionEncoding(nn.Module):
     return x + self.positional_embedding[: x.size(1), :]
 
 class TransformerBlock(nn.Module):
-  def __init__(self, embed_size: int):
+  def __init__(self, embed_size: int, num_heads: int = None):
     super().__init__()
-    self.attention_layer = SelfAttentionLayer(embed_size)
+    # num_heads=None mantiene la capa original de una sola cabeza
+    if num_heads is None:
+      self.attention_layer = SelfAttentionLayer(embed_size)
+    else:
+      self.attention_layer = MultiHeadAttention(embed_size, num_heads)
     self.feed_forward = FeedForward(embed_size)
     self.layer_norm1 = nn.LayerNorm(embed_size)
 
-  def forward(self, x: torch.Tensor):
-    context = self.attention_layer(x)
+  def forward(self, x: torch.Tensor, key_padding_mask: torch.Tensor = None):
+    context = self.attention_layer(x, key_padding_mask)
     context = self.layer_norm1(context)
     context = self.feed_forward(context)
     context = F.gelu(context)
@@ -97,22 +124,25 @@ class TransformerBlock(nn.Module):
     return output
 
 class Transformer(nn.Module):
-  def __init__(self, embed_size: int, num_layers: int, max_seq_length: int):
+  def __init__(self, embed_size: int, num_layers: int, max_seq_length: int, num_heads: int = None):
     super().__init__()
     self.positional_encoding = SinusoidalPositionEncoding(
         embed_size, max_seq_length
     )
     self.transformer_blocks = nn.ModuleList(
-        [TransformerBlock(embed_size) for _ in range(num_layers)]
+        [TransformerBlock(embed_size, num_heads) for _ in range(num_layers)]
     )
 
-  def forward(self, x: torch.Tensor):
+  def forward(self, x: torch.Tensor, key_padding_mask: torch.Tensor = None):
     x = self.positional_encoding(x)
     for transformer_block in self.transformer_blocks:
-      x = transformer_block(x)
+      x = transformer_block(x, key_padding_mask)
     return x
 
 if __name__ == "__main__":
   transformer = Transformer(embed_size=128, num_layers=3, max_seq_length=15)
   x = torch.randn(2, 10, 128)
   print(transformer(x).shape)
+  transformer = Transformer(embed_size=128, num_layers=3, max_seq_length=15, num_heads=4)
+  key_padding_mask = torch.arange(10)[None, :] >= torch.tensor([[10], [6]])
+  print(transformer(x, key_padding_mask).shape)
@@ -0,0 +1,182 @@
+"""Shards de audio y tokens preprocesados, leidos con memmap.
+
+Se generan una sola vez con:
+
+    python shards.py data/shards --audio-dtype int16
+
+y se entrena con get_dataset(shard_dir="data/shards"). Cada shard es un par de archivos
+binarios contiguos (audio y token ids); index.npy guarda shard, offset y largo de cada
+ejemplo, asi __getitem__ es un slice del memmap sin pasar por el dataset de HF ni el
+tokenizer.
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+AUDIO_DTYPES = ("int16", "float16")
+INDEX_DTYPE = np.dtype([
+    ("shard", np.int32),
+    ("audio_offset", np.int64),
+    ("audio_len", np.int64),
+    ("ids_offset", np.int64),
+    ("ids_len", np.int32),
+])
+IDS_DTYPE = np.int32
+INT16_SCALE = 32767.0
+
+def shard_paths(shard_dir, shard):
+  prefix = os.path.join(shard_dir, f"shard_{shard:05d}")
+  return prefix + ".audio.bin", prefix + ".ids.bin"
+
+def encode_audio(waveform, audio_dtype):
+  waveform = np.asarray(waveform, dtype=np.float32)
+  if audio_dtype == "int16":
+    return np.round(np.clip(waveform, -1.0, 1.0) * INT16_SCALE).astype(np.int16)
+  return waveform.astype(np.float16)
+
+def write_shards(dataset, tokenizer, shard_dir, audio_dtype="int16", shard_size_mb=256, num_examples=None):
+  """Recorre el dataset (ya limpio y con el audio a la frecuencia final) una sola vez."""
+  if audio_dtype not in AUDIO_DTYPES:
+    raise ValueError(f"audio_dtype must be one of {AUDIO_DTYPES}")
+  os.makedirs(shard_dir, exist_ok=True)
+  total = len(dataset) if num_examples is None else min(num_examples, len(dataset))
+  shard_bytes = shard_size_mb * 1024 * 1024
+
+  index = np.zeros(total, dtype=INDEX_DTYPE)
+  texts = []
+  sample_rate = None
+  shard, audio_offset, ids_offset = 0, 0, 0
+  audio_file, ids_file = None, None
+  try:
+    for idx in range(total):
+      item = dataset[idx]
+      sample_rate = sample_rate or item["audio"]["sampling_rate"]
+      audio = encode_audio(item["audio"]["array"], audio_dtype)
+      text = item["text"].upper()
+      ids = np.asarray(tokenizer.encode(text).ids, dtype=IDS_DTYPE)
+
+      if audio_file is not None and audio_offset * audio.itemsize >= shard_bytes:
+        audio_file.close()
+        ids_file.close()
+        audio_file = None
+        shard += 1
+      if audio_file is None:
+        audio_path, ids_path = shard_paths(shard_dir, shard)
+        audio_file, ids_file = open(audio_path, "wb"), open(ids_path, "wb")
+        audio_offset, ids_offset = 0, 0
+
+      audio_file.write(audio.tobytes())
+      ids_file.write(ids.tobytes())
+      index[idx] = (shard, audio_offset, len(audio), ids_offset, len(ids))
+      texts.append(text)
+      audio_offset += len(audio)
+      ids_offset += len(ids)
+
+      if (idx + 1) % 1000 == 0:
+        print(f"{idx + 1}/{total} ejemplos escritos")
+  finally:
+    if audio_file is not None:
+      audio_file.close()
+      ids_file.close()
+
+  np.save(os.path.join(shard_dir, "index.npy"), index)
+  with open(os.path.join(shard_dir, "texts.json"), "w", encoding="utf-8") as f:
+    json.dump(texts, f, ensure_ascii=False)
+  metadata = {
+      "num_examples": total,
+      "num_shards": shard + 1 if total else 0,
+      "sample_rate": sample_rate,
+      "audio_dtype": audio_dtype,
+      "vocab_size": len(tokenizer.get_vocab()),
+  }
+  with open(os.path.join(shard_dir, "metadata.json"), "w", encoding="utf-8") as f:
+    json.dump(metadata, f, indent=2)
+  return metadata
+
+class ShardedDataset(Dataset):
+  """Mismos items que CommonVoiceDataset ("audio", "text", "speaker_id") leidos de los shards.
+
+  Los memmaps se abren recien en el primer __getitem__ de cada proceso, asi cada worker
+  del DataLoader tiene los suyos y las paginas las comparte el page cache del sistema.
+  """
+
+  def __init__(self, shard_dir, num_examples=None):
+    self.shard_dir = shard_dir
+    with open(os.path.join(shard_dir, "metadata.json"), encoding="utf-8") as f:
+      self.metadata = json.load(f)
+    with open(os.path.join(shard_dir, "texts.json"), encoding="utf-8") as f:
+      self.texts = json.load(f)
+    self.index = np.load(os.path.join(shard_dir, "index.npy"))
+    self.audio_dtype = np.dtype(self.metadata["audio_dtype"])
+    self.num_examples = (
+        min(num_examples, len(self.index))
+        if num_examples is not None
+        else len(self.index)
+    )
+    self._audio = None
+    self._ids = None
+
+  def __len__(self):
+    return self.num_examples
+
+  def lengths(self):
+    return self.index["audio_len"][:self.num_examples].tolist()
+
+  def _open(self):
+    self._audio, self._ids = [], []
+    for shard in range(self.metadata["num_shards"]):
+      audio_path, ids_path = shard_paths(self.shard_dir, shard)
+      self._audio.append(np.memmap(audio_path, dtype=self.audio_dtype, mode="r"))
+      # Un shard sin tokens (todos los textos vacios) queda en 0 bytes y memmap no lo acepta
+      self._ids.append(
+          np.memmap(ids_path, dtype=IDS_DTYPE, mode="r")
+          if os.path.getsize(ids_path)
+          else np.zeros(0, dtype=IDS_DTYPE)
+      )
+
+  def __getitem__(self, idx):
+    if self._audio is None:
+      self._open()
+    entry = self.index[idx]
+    shard = int(entry["shard"])
+    start = int(entry["audio_offset"])
+    audio = self._audio[shard][start:start + int(entry["audio_len"])]
+    start = int(entry["ids_offset"])
+    ids = self._ids[shard][start:start + int(entry["ids_len"])]
+
+    # El slice no copia; la unica copia es la conversion a float32 que espera el modelo
+    waveform = torch.from_numpy(audio.astype(np.float32))
+    if self.audio_dtype == np.int16:
+      waveform /= INT16_SCALE
+    return {"audio": waveform, "text": self.texts[idx], "speaker_id": ids.tolist()}
+
+def main():
+  parser = argparse.ArgumentParser(description="Preprocesa el dataset de entrenamiento a shards con memmap")
+  parser.add_argument("shard_dir")
+  parser.add_argument("--audio-dtype", choices=AUDIO_DTYPES, default="int16")
+  parser.add_argument("--sample-rate", type=int, default=None,
+                      help="Remuestrear el audio (por defecto se deja la frecuencia original)")
+  parser.add_argument("--shard-size-mb", type=int, default=256)
+  parser.add_argument("--num-examples", type=int, default=None)
+  args = parser.parse_args()
+
+  from dataset import get_tokenizer, load_source_dataset
+
+  dataset = load_source_dataset(sample_rate=args.sample_rate)
+  metadata = write_shards(
+      dataset,
+      get_tokenizer(),
+      args.shard_dir,
+      audio_dtype=args.audio_dtype,
+      shard_size_mb=args.shard_size_mb,
+      num_examples=args.num_examples,
+  )
+  print(f"{metadata['num_examples']} ejemplos en {metadata['num_shards']} shards ({args.shard_dir})")
+
+if __name__ == "__main__":
+  main()
@@ -14,12 +14,16 @@ os.environ["PYTORCH_ENABLE_MPS_FALLBACK"] = "1"
 
 from torch.utils.tensorboard import SummaryWriter
 
+import contextlib
+import time
+
 import torch
-torch.autograd.set_detect_anomaly(True)
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
 
 from dataset import get_dataset, get_tokenizer
+from training import LEARNING_RATE, create_model, run_loss_function
 from transcribe_model import TranscribeModel
-from torch import nn
 
 vq_initial_loss_weight = 10
 vq_warmup_steps = 1000
@@ -32,69 +36,128 @@ num_batch_repeats = 1
 
 starting_steps = 0
 BATCH_SIZE = 64
-LEARNING_RATE = 0.005
-
-def run_loss_function(log_probs, target, blank_token):
-  #Add log_softmax to ensure proper probability distribution
+# Directorio generado con `python shards.py <dir>`; None lee el dataset de HF en cada epoch
+SHARD_DIR = os.getenv("SHARD_DIR")
+NUM_WORKERS = int(os.getenv("NUM_WORKERS", "4"))
+# Batches con clips de largo parecido; MAX_BATCH_SAMPLES arma los batches por presupuesto de muestras.
+# Por defecto solo con SHARD_DIR: sin shards los largos salen de decodificar todo el dataset
+# antes del primer batch (y en cada rank con DDP)
+BUCKET_BY_LENGTH = os.getenv("BUCKET_BY_LENGTH", "1" if SHARD_DIR else "0") == "1"
+MAX_BATCH_SAMPLES = int(os.getenv("MAX_BATCH_SAMPLES", "0")) or None
+# detect_anomaly hace mucho mas lento cada backward: solo para depurar NaN/inf
+DEBUG_ANOMALY = os.getenv("DEBUG_ANOMALY", "0") == "1"
+# Autocast: "bf16", "fp16" (con GradScaler) o "" para entrenar en fp32
+AMP_DTYPE = os.getenv("AMP_DTYPE", "")
+AMP_DTYPES = {"": None, "bf16": torch.bfloat16, "fp16": torch.float16}
+# Batch efectivo = BATCH_SIZE * GRAD_ACCUMULATION_STEPS
+GRAD_ACCUMULATION_STEPS = int(os.getenv("GRAD_ACCUMULATION_STEPS", "1"))
+LOG_EVERY = 20
+# Con torchrun (WORLD_SIZE > 1) se entrena con DDP; gloo funciona solo con CPU y entre nodos
+DDP_BACKEND = os.getenv("DDP_BACKEND", "gloo")
 
-  loss_function = nn.CTCLoss(blank=blank_token)
-  input_lengths = tuple(log_probs.shape[1] for _ in range(log_probs.shape[0]))
-  target_lengths = (target != blank_token).sum(dim=1)
-  target_lengths = tuple(t.item() for t in target_lengths)
-  input_seq_first = log_probs.permute(1, 0, 2)
-  loss = loss_function(input_seq_first, target, input_lengths, target_lengths)
-  return loss
+def init_distributed():
+  """Devuelve (rank, world_size, local_rank); sin torchrun es (0, 1, 0)."""
+  world_size = int(os.getenv("WORLD_SIZE", "1"))
+  if world_size == 1:
+    return 0, 1, 0
+  dist.init_process_group(backend=DDP_BACKEND)
+  return dist.get_rank(), world_size, int(os.getenv("LOCAL_RANK", "0"))
 
 def main():
-  log_dir = f"runs/{model_id}"
-  if os.path.exists(log_dir):
-    import shutil
-    shutil.rmtree(log_dir)
-  writer = SummaryWriter(log_dir)
+  rank, world_size, local_rank = init_distributed()
+  is_main = rank == 0
+
+  # TensorBoard, checkpoints y prints solo desde el rank 0
+  writer = None
+  if is_main:
+    log_dir = f"runs/{model_id}"
+    if os.path.exists(log_dir):
+      import shutil
+      shutil.rmtree(log_dir)
+    writer = SummaryWriter(log_dir)
 
   tokenizer = get_tokenizer()
   blank_token = tokenizer.token_to_id("□")
 
-  device = torch.device("cuda" if torch.cuda.is_available() else "mps" if torch.backends.mps.is_available() else "cpu")
-  print(f"Using device: {device}")
+  if world_size > 1 and DDP_BACKEND == "nccl":
+    device = torch.device(f"cuda:{local_rank}")
+    torch.cuda.set_device(device)
+  elif world_size > 1:
+    device = torch.device("cpu")
+  else:
+    device = torch.device("cuda" if torch.cuda.is_available() else "mps" if torch.backends.mps.is_available() else "cpu")
+  if is_main:
+    print(f"Using device: {device}, processes: {world_size}")
 
   if os.path.exists(f"models/{model_id}/model_latest.pth"):
-    print(f"Loading model from models/{model_id}/model_latest.pth")
+    if is_main:
+      print(f"Loading model from models/{model_id}/model_latest.pth")
     model = TranscribeModel.load(f"models/{model_id}/model_latest.pth").to(device)
   else:
-    model = TranscribeModel(
-        num_codebooks=2,
-        codebook_size=32,
-        embedding_dim=16,
-        num_transformer_layers=2,
-        vocab_size=len(tokenizer.get_vocab()),
-        strides=[6, 6, 6],
-        initial_mean_pooling_kernel_size=4,
-        max_seq_length=400,
-    ).to(device)
+    model = create_model(len(tokenizer.get_vocab())).to(device)
+
+  # output_layer no participa del forward: congelado, DDP no espera sus gradientes y no
+  # hace falta find_unused_parameters (que recorre el grafo en cada paso)
+  model.output_layer.requires_grad_(False)
 
   num_trainable_params = sum(p.numel() for p in model.parameters() if p.requires_grad)
-  print(f"Number of trainable parameters: {num_trainable_params}")
+  if is_main:
+    print(f"Number of trainable parameters: {num_trainable_params}")
+
+  # DDP copia los pesos del rank 0 al resto. El forward pasa por train_model;
+  # output_lengths y save usan el modelo sin envolver
+  train_model = model
+  if world_size > 1:
+    train_model = DistributedDataParallel(
+        model,
+        device_ids=[local_rank] if device.type == "cuda" else None,
+    )
 
   optimizer = torch.optim.Adam(model.parameters(), lr=LEARNING_RATE)
+  torch.autograd.set_detect_anomaly(DEBUG_ANOMALY)
+  if AMP_DTYPE not in AMP_DTYPES:
+    raise ValueError(f"AMP_DTYPE must be one of {list(AMP_DTYPES)}")
 
   dataloader = get_dataset(
       batch_size=BATCH_SIZE,
       num_examples=num_examples,
-      num_workers=1
+      num_workers=NUM_WORKERS,
+      shard_dir=SHARD_DIR,
+      bucket_by_length=BUCKET_BY_LENGTH,
+      max_batch_samples=MAX_BATCH_SAMPLES,
+      rank=rank,
+      world_size=world_size,
   )
 
-  ctc_losses = []
-  vq_losses = []
+  amp_dtype = AMP_DTYPES[AMP_DTYPE]
+  # Saltear un paso en un solo proceso desincroniza DDP: con varios procesos siempre zero_infinity
+  check_inf = DEBUG_ANOMALY and world_size == 1
+  # Solo fp16 necesita escalar la loss; con bf16 o fp32 el scaler queda deshabilitado
+  scaler = torch.amp.GradScaler(device.type, enabled=amp_dtype == torch.float16)
+
+  # Acumuladores en el device: se sincroniza con .item() solo al loguear
+  ctc_loss_sum = torch.zeros((), device=device)
+  vq_loss_sum = torch.zeros((), device=device)
+  infeasible_sum = torch.zeros((), device=device, dtype=torch.long)
+  padding_ratios = []
+  logged_batches = 0
+  logged_samples = 0
+  log_start = time.perf_counter()
   num_batches = len(dataloader)
   steps = starting_steps
+  micro_steps = 0
+  optimizer.zero_grad(set_to_none=True)
 
   for i in range(num_epochs):
+    for sampler in (dataloader.sampler, dataloader.batch_sampler):
+      if hasattr(sampler, "set_epoch"):
+        sampler.set_epoch(i)
     for idx, batch in enumerate(dataloader):
       for repeat_batch in range(num_batch_repeats):
         audio = batch["audio"]
         target = batch["speaker_id"]
         text = batch["text"]
+        audio_lengths = batch["audio_lengths"]
 
         if target.shape[1] > audio.shape[1]:
           print(
@@ -105,62 +168,128 @@ def main():
           )
           print("After padding: ", audio.shape)
 
-        audio = audio.to(device)
-        target = target.to(device)
-
-        optimizer.zero_grad()
-        output, vq_loss = model(audio)
-        ctc_loss = run_loss_function(output, target, blank_token)
+        audio = audio.to(device, non_blocking=True)
+        target = target.to(device, non_blocking=True)
+        input_lengths = model.output_lengths(audio_lengths).to(device, non_blocking=True)
 
-        vq_loss_weight = max(
-            vq_final_loss_weight,
-            vq_initial_loss_weight
-            - (vq_initial_loss_weight - vq_final_loss_weight)
-            * (steps / vq_warmup_steps),
+        # En los micro-batches intermedios de la acumulacion DDP no sincroniza gradientes
+        # (forward y backward tienen que quedar dentro de no_sync)
+        sync_context = (
+            train_model.no_sync()
+            if world_size > 1 and (micro_steps + 1) % GRAD_ACCUMULATION_STEPS
+            else contextlib.nullcontext()
         )
-        if vq_loss is None:
-          loss = ctc_loss
-        else:
-          loss = ctc_loss + vq_loss_weight * vq_loss
+        with sync_context:
+          with torch.autocast(device.type, dtype=amp_dtype, enabled=amp_dtype is not None):
+            output, vq_loss = train_model(audio, audio_lengths)
+          # La CTC va en fp32 aunque el modelo corra con autocast
+          ctc_loss = run_loss_function(
+              output.float(), target, blank_token, input_lengths, zero_infinity=not check_inf
+          )
 
-        if torch.isinf(loss):
-          print("Loss is inf, skipping step", audio.shape, target.shape)
+          vq_loss_weight = max(
+              vq_final_loss_weight,
+              vq_initial_loss_weight
+              - (vq_initial_loss_weight - vq_final_loss_weight)
+              * (steps / vq_warmup_steps),
+          )
+          if vq_loss is None:
+            loss = ctc_loss
+          else:
+            loss = ctc_loss + vq_loss_weight * vq_loss.float()
+
+          if check_inf:
+            # Chequeo sincronico, solo en modo debug
+            if torch.isinf(loss):
+              print("Loss is inf, skipping step", audio.shape, target.shape)
+              continue
+          else:
+            # Con zero_infinity la CTC de esos ejemplos queda en 0; se cuentan sin sincronizar
+            target_lengths = (target != blank_token).sum(dim=1)
+            infeasible_sum += (input_lengths < target_lengths).sum()
+
+          scaler.scale(loss / GRAD_ACCUMULATION_STEPS).backward()
+
+        ctc_loss_sum += ctc_loss.detach()
+        vq_loss_sum += vq_loss.detach().float()
+        padding_ratios.append(1 - audio_lengths.sum().item() / audio.numel())
+        logged_batches += 1
+        logged_samples += audio.shape[0]
+        micro_steps += 1
+        if micro_steps % GRAD_ACCUMULATION_STEPS:
           continue
-        loss.backward()
 
+        scaler.unscale_(optimizer)
         torch.nn.utils.clip_grad_norm_(
             model.parameters(), max_norm=10.0
         )
-        optimizer.step()
-
-        ctc_losses.append(ctc_loss.item())
-        vq_losses.append(vq_loss.item())
+        scaler.step(optimizer)
+        scaler.update()
+        optimizer.zero_grad(set_to_none=True)
         steps += 1
 
-        if steps % 20 == 0:
-          avg_ctc_loss = sum(ctc_losses) / len(ctc_losses)
-          avg_vq_loss = sum(vq_losses) / len(vq_losses)
+        if steps % LOG_EVERY == 0:
+          totals = torch.stack([
+              ctc_loss_sum,
+              vq_loss_sum,
+              infeasible_sum.float(),
+              torch.tensor(float(logged_batches), device=device),
+              torch.tensor(float(logged_samples), device=device),
+          ])
+          if world_size > 1:
+            # Promedio entre procesos: un all_reduce cada LOG_EVERY pasos
+            dist.all_reduce(totals)
+          ctc_total, vq_total, infeasible, batches_total, samples_total = totals.tolist()
+          avg_ctc_loss = ctc_total / batches_total
+          avg_vq_loss = vq_total / batches_total
           avg_loss = avg_ctc_loss + vq_loss_weight * avg_vq_loss
-          print(
-              f"Num Steps: {steps}, Batch: {idx + 1}/{num_batches}, ctc_loss: {avg_ctc_loss:.3f}, vq_loss: {avg_vq_loss:.3f}, total loss: {avg_loss:.3f}"
-          )
-          ctc_losses = []
-          vq_losses = []
+          avg_padding = sum(padding_ratios) / len(padding_ratios)
+          elapsed = time.perf_counter() - log_start
+          steps_per_sec = LOG_EVERY / elapsed
+          samples_per_sec = samples_total / elapsed
+
+          if is_main:
+            print(
+                f"Num Steps: {steps}, Batch: {idx + 1}/{num_batches}, ctc_loss: {avg_ctc_loss:.3f}, vq_loss: {avg_vq_loss:.3f}, total loss: {avg_loss:.3f}, "
+                f"{steps_per_sec:.2f} steps/s, {samples_per_sec:.1f} samples/s"
+            )
+            if infeasible:
+              print(f"{int(infeasible)} ejemplos con target mas largo que el audio (CTC en 0)")
 
-          # --- Probablemente lo siguiente: logging ---
-          writer.add_scalar("Loss/CTC", avg_ctc_loss, steps)
-          writer.add_scalar("Loss/VQ", avg_vq_loss, steps)
-          writer.add_scalar("Loss/Total", avg_loss, steps)
+            # --- Probablemente lo siguiente: logging ---
+            writer.add_scalar("Loss/CTC", avg_ctc_loss, steps)
+            writer.add_scalar("Loss/VQ", avg_vq_loss, steps)
+            writer.add_scalar("Loss/Total", avg_loss, steps)
+            writer.add_scalar("Data/PaddingRatio", avg_padding, steps)
+            writer.add_scalar("Data/InfeasibleTargets", infeasible, steps)
+            writer.add_scalar("Perf/StepsPerSec", steps_per_sec, steps)
+            writer.add_scalar("Perf/SamplesPerSec", samples_per_sec, steps)
+            if scaler.is_enabled():
+              writer.add_scalar("Perf/GradScale", scaler.get_scale(), steps)
 
-        if steps % 500 == 0:
+          ctc_loss_sum.zero_()
+          vq_loss_sum.zero_()
+          infeasible_sum.zero_()
+          padding_ratios = []
+          logged_batches = 0
+          logged_samples = 0
+          log_start = time.perf_counter()
+
+        if steps % 500 == 0 and is_main:
           save_path = f"models/{model_id}/model_latest.pth"
           os.makedirs(os.path.dirname(save_path), exist_ok=True)
           model.save(save_path)
           print(f"Model saved to {save_path}")
 
   # --- Al final del entrenamiento ---
-  writer.close()
-  save_path = f"models/{model_id}/model_final.pth"
-  os.makedirs(os.path.dirname(save_path), exist_ok=True)
-  model.save(save_path)
-  print(f"Training complete. Final model saved to {save_path}")
+  if is_main:
+    writer.close()
+    save_path = f"models/{model_id}/model_final.pth"
+    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+    model.save(save_path)
+    print(f"Training complete. Final model saved to {save_path}")
+  if world_size > 1:
+    dist.destroy_process_group()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,44 @@
+"""Modelo y loss de entrenamiento compartidos por train.py y benchmark_ddp.py.
+
+No importa dataset.py, asi los benchmarks no cargan el stack de datos (datasets,
+torchaudio, tokenizers) para entrenar con batches sinteticos.
+"""
+
+import os
+
+import torch
+from torch import nn
+
+from transcribe_model import TranscribeModel
+
+LEARNING_RATE = 0.005
+# Cabezas de MultiHeadAttention (QKV fusionado + SDPA); 0 usa SelfAttentionLayer de una cabeza
+ATTENTION_HEADS = int(os.getenv("ATTENTION_HEADS", "0")) or None
+
+def run_loss_function(log_probs, target, blank_token, input_lengths=None, zero_infinity=False):
+  #Add log_softmax to ensure proper probability distribution
+
+  loss_function = nn.CTCLoss(blank=blank_token, zero_infinity=zero_infinity)
+  if input_lengths is None:
+    input_lengths = torch.full((log_probs.shape[0],), log_probs.shape[1], dtype=torch.long)
+  else:
+    # Los frames que salen del padding del batch no cuentan para la CTC
+    input_lengths = input_lengths.clamp(1, log_probs.shape[1])
+  # Largos como tensores (no tuplas con .item()) para no sincronizar con el device en cada paso
+  target_lengths = (target != blank_token).sum(dim=1)
+  input_seq_first = log_probs.permute(1, 0, 2)
+  loss = loss_function(input_seq_first, target, input_lengths, target_lengths)
+  return loss
+
+def create_model(vocab_size):
+  return TranscribeModel(
+      num_codebooks=2,
+      codebook_size=32,
+      embedding_dim=16,
+      num_transformer_layers=2,
+      vocab_size=vocab_size,
+      strides=[6, 6, 6],
+      initial_mean_pooling_kernel_size=4,
+      max_seq_length=400,
+      num_attention_heads=ATTENTION_HEADS,
+  )
@@ -24,6 +24,7 @@ class TranscribeModel(nn.Module):
     initial_mean_pooling_kernel_size: int,
     num_transformer_layers: int,
     max_seq_length: int = 2000,
+    num_attention_heads: int = None,
   ):
     super().__init__()
     self.options = {
@@ -35,6 +36,7 @@ class TranscribeModel(nn.Module):
         "num_transformer_layers": num_transformer_layers,
         "initial_mean_pooling_kernel_size": initial_mean_pooling_kernel_size,
         "max_seq_length": max_seq_length,
+        "num_attention_heads": num_attention_heads,
     }
     self.downsampling_network = DownsamplingNetwork(
         embedding_dim=embedding_dim,
@@ -46,19 +48,28 @@ class TranscribeModel(nn.Module):
         embedding_dim,
         num_layers=num_transformer_layers,
         max_seq_length=max_seq_length,
+        num_heads=num_attention_heads,
     )
     self.rvq = ResidualVectorQuantizer(num_codebooks, codebook_size, embedding_dim)
     self.output_layer = nn.Linear(embedding_dim, vocab_size)
 
-  def forward(self, x: torch.Tensor):
+  def forward(self, x: torch.Tensor, audio_lengths: torch.Tensor = None):
     loss = torch.tensor(0.0)
     x = x.unsqueeze(1)
     x = self.downsampling_network(x)
-    x = self.pre_rvq_transformer(x)
+    key_padding_mask = None
+    if audio_lengths is not None:
+      # Los frames que salen del padding del batch no se usan como keys
+      lengths = self.output_lengths(audio_lengths).clamp(min=1).to(x.device)
+      key_padding_mask = torch.arange(x.shape[1], device=x.device)[None, :] >= lengths[:, None]
+    x = self.pre_rvq_transformer(x, key_padding_mask)
     x, loss = self.rvq(x)
     x = torch.log_softmax(x, dim=-1)
     return x, loss
 
+  def output_lengths(self, audio_lengths: torch.Tensor):
+    return self.downsampling_network.output_lengths(audio_lengths)
+
   def save(self, path: str):
     print("Saving model to ", path)
     torch.save({"model": self.state_dict(), "options": self.options}, path)
@@ -8,6 +8,7 @@ import axios from "axios";
 import BcryptAdapter from "./adapters/BcryptAdapter.js";
 import JwtAdapter from "./adapters/JwtAdapter.js";
 import AxiosHttpClient from "./http/AxiosHttpClient.js";
+import { requestId } from "./http/requestId.js";
 
 // db
 import db from "./db/sqlite.js";
@@ -37,8 +38,9 @@ import voiceRoutes from './routes/voice.js';
 
 export function buildApp() {
     const app = express();
-    app.use(cors());
+    app.use(cors({ exposedHeaders: ["X-Request-ID"] }));
     app.use(express.json());
+    app.use(requestId);
 
     // Adapters
     const passwordHasher = new BcryptAdapter(bcryptLib, 10);
@@ -10,7 +10,7 @@ export default class CaptionController {
         try {
             const imagePath = req.file.path;
 
-            const caption = await this.captionService.generateCaption(imagePath);
+            const caption = await this.captionService.generateCaption(imagePath, req.id);
 
             fs.unlinkSync(imagePath);  
 
@@ -9,7 +9,7 @@ export default class OrchestratorController {
         let imgPath = req.file.path;
 
         try {
-            const { captionText, audioUrl } = await this.orchestratorService.processImage(imgPath);
+            const { captionText, audioUrl } = await this.orchestratorService.processImage(imgPath, req.id);
 
             fs.unlinkSync(imgPath);
 
@@ -6,7 +6,7 @@ export default class TtsController {
     async speak(req, res) {
         try {  
             const { text } = req.body;
-            const audioUrl = await this.ttsService.generateAudio(text);
+            const audioUrl = await this.ttsService.generateAudio(text, req.id);
 
             return res.json({ audioUrl });
         } catch (err) {
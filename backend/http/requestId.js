@@ -0,0 +1,15 @@
+import { randomUUID } from "crypto";
+
+export const REQUEST_ID_HEADER = "X-Request-ID";
+
+// Reutiliza el X-Request-ID entrante o genera uno; los servicios lo reenvían a
+// captioning / tts / speech-to-text para seguir un pedido de punta a punta.
+export function requestId(req, res, next) {
+    req.id = req.get(REQUEST_ID_HEADER) || randomUUID();
+    res.setHeader(REQUEST_ID_HEADER, req.id);
+    next();
+}
+
+export function requestIdHeaders(id) {
+    return id ? { [REQUEST_ID_HEADER]: id } : {};
+}
@@ -15,7 +15,19 @@ router.post('/transcribe', upload.single('audio'), async (req, res) => {
         }
 
         const voiceService = new VoiceService();
-        const transcription = await voiceService.transcribeAudio(req.file.buffer);
+
+        // ?mode=command devuelve texto e intención en un solo viaje
+        if (req.query.mode === 'command') {
+            const { text, command } = await voiceService.transcribeCommand(req.file.buffer, req.id);
+            return res.json({
+                success: true,
+                text: text,
+                language: 'es-AR',
+                command: command
+            });
+        }
+
+        const transcription = await voiceService.transcribeAudio(req.file.buffer, req.id);
 
         res.json({
             success: true,
@@ -1,5 +1,6 @@
 import fs from "fs";
 import FormData from "form-data";
+import { requestIdHeaders } from "../http/requestId.js";
 
 export default class CaptionService {
     constructor(httpClient, captionURL) {
@@ -7,7 +8,7 @@ export default class CaptionService {
         this.captionURL = captionURL;
     }
 
-    async generateCaption(imagePath) {
+    async generateCaption(imagePath, requestId) {
         try {
             const imageBuffer = fs.createReadStream(imagePath);
 
@@ -18,7 +19,7 @@ export default class CaptionService {
             });
 
             const response = await this.httpClient.post(`${this.captionURL}`, form, {
-                headers: form.getHeaders(),
+                headers: { ...form.getHeaders(), ...requestIdHeaders(requestId) },
             });
 
             return response.data.caption;
@@ -4,10 +4,11 @@ export default class OrchestratorService{
         this.ttsService = ttsService;
     }
 
-    async processImage(imagePath) {
-        const captionText = await this.captionService.generateCaption(imagePath);
+    async processImage(imagePath, requestId) {
+        // Mismo request ID en captioning y tts para poder seguir el flujo completo
+        const captionText = await this.captionService.generateCaption(imagePath, requestId);
 
-        const audioUrl = await this.ttsService.generateAudio(captionText);
+        const audioUrl = await this.ttsService.generateAudio(captionText, requestId);
 
         return { captionText, audioUrl };
     }
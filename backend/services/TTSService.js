@@ -1,10 +1,12 @@
+import { requestIdHeaders } from "../http/requestId.js";
+
 export default class TTSService {
     constructor(httpClient, ttsUrl) {
         this.httpClient = httpClient;
         this.ttsUrl = ttsUrl;
     }
 
-    async generateAudio(text) {
+    async generateAudio(text, requestId) {
         try {
             const ttsResponse = await this.httpClient.post(
                 `${this.ttsUrl}`, 
@@ -12,7 +14,8 @@ export default class TTSService {
                     text,
                     voice: "bm_fable",
                     speed: 1.0
-                }
+                },
+                { headers: requestIdHeaders(requestId) }
             );
 
             return ttsResponse.data.audio_url;
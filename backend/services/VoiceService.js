@@ -1,12 +1,30 @@
 import axios from 'axios';
 import FormData from 'form-data';
+import { requestIdHeaders } from '../http/requestId.js';
 
 export class VoiceService {
     constructor() {
         this.whisperApiUrl = process.env.WHISPER_API_URL || 'http://speech-to-text:5000';
     }
 
-    async transcribeAudio(audioBuffer) {
+    async transcribeAudio(audioBuffer, requestId) {
+        const data = await this.requestTranscription(audioBuffer, 'text', requestId);
+        return data.text || data.transcription;
+    }
+
+    // Modo comando: el servicio de STT decodifica sesgado al vocabulario de comandos
+    // y devuelve la intención ya interpretada, sin pasar por interpretCommand.
+    async transcribeCommand(audioBuffer, requestId) {
+        const data = await this.requestTranscription(audioBuffer, 'command', requestId);
+        return {
+            text: data.text || '',
+            command: data.command && data.command.action !== 'unknown'
+                ? data.command
+                : await this.interpretCommand(data.text)
+        };
+    }
+
+    async requestTranscription(audioBuffer, mode = 'text', requestId) {
         try {
             const formData = new FormData();
             formData.append('file', audioBuffer, {
@@ -19,12 +37,14 @@ export class VoiceService {
             const response = await axios.post(`${this.whisperApiUrl}/transcribe`, formData, {
                 headers: {
                     ...formData.getHeaders(), 
+                    ...requestIdHeaders(requestId),
                 },
+                params: { mode },
                 maxBodyLength: Infinity,
                 maxContentLength: Infinity
             });
 
-            return response.data.text || response.data.transcription;
+            return response.data;
 
         } catch (error) {
             console.error('Error en VoiceService:', error.message);
@@ -39,21 +59,24 @@ export class VoiceService {
         if (!text) return { action: 'unknown', confidence: 0, originalText: '' };
         const lowerText = text.toLowerCase();
         
+        // El \b de JS solo toma letras ASCII ("á" cuenta como separador); estos limites
+        // usan \p{L}, igual que el \b de Python en SpeechToText/commands.py
+        const words = (source) => new RegExp(`(?<![\\p{L}\\p{N}_])(?:${source})(?![\\p{L}\\p{N}_])`, 'u');
         const commandPatterns = [
             {
-                pattern: /(login|inicio|entrar|ingresar)/,
+                pattern: words('login|inicio|entrar|ingresar(?:me|se)?'),
                 action: 'navigate_login'
             },
             {
-                pattern: /(registro|registrar|crear cuenta)/,
+                pattern: words('registro|registrar(?:me|se)?|reg[ií]str(?:ate|ame)|crear cuenta'),
                 action: 'navigate_register'
             },
             {
-                pattern: /(cámara|camara|visión|vision)/,
+                pattern: words('cámara|camara|visión|vision'),
                 action: 'navigate_camera'
             },
             {
-                pattern: /escribir\s+(.+?)\s+en\s+(email|correo)/,
+                pattern: words('escribir\\s+(.+?)\\s+en\\s+(email|correo)'),
                 action: 'fill_email',
                 extract: (match) => ({ value: match[1] })
             }
@@ -0,0 +1,110 @@
+"""Compara la ingesta de imagenes anterior (decode completo + BlipProcessor) contra
+la nueva (draft decode + ImagePreprocessor) en tiempo por imagen y RSS pico.
+
+Cada modo corre en un subproceso propio para que el RSS pico no se mezcle.
+
+    python benchmark_ingest.py fotos/*.jpg
+    python benchmark_ingest.py            # genera una JPEG sintetica de 12 MP
+"""
+import argparse
+import io
+import json
+import resource
+import subprocess
+import sys
+import time
+
+MODEL_NAME = "Salesforce/blip-image-captioning-base"
+TARGET_SIZE = (384, 384)
+
+
+def peak_rss_mb() -> float:
+    # En Linux ru_maxrss esta en KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def synthetic_jpeg(width: int = 4000, height: int = 3000) -> bytes:
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(height // 8, width // 8, 3), dtype=np.uint8)
+    img = Image.fromarray(pixels).resize((width, height), Image.BILINEAR)
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def load_payloads(paths: list[str]) -> list[bytes]:
+    if not paths:
+        return [synthetic_jpeg()]
+    payloads = []
+    for path in paths:
+        with open(path, "rb") as f:
+            payloads.append(f.read())
+    return payloads
+
+
+def run_mode(mode: str, paths: list[str], repeats: int) -> dict:
+    from PIL import Image
+    from transformers import BlipProcessor
+
+    from ingest import ImagePreprocessor, decode_image
+
+    payloads = load_payloads(paths)
+    processor = BlipProcessor.from_pretrained(MODEL_NAME)
+    preprocessor = ImagePreprocessor(processor.image_processor, max_batch_size=1)
+    baseline_rss = peak_rss_mb()
+
+    timings = []
+    for _ in range(repeats):
+        for data in payloads:
+            start = time.perf_counter()
+            if mode == "legacy":
+                img = Image.open(io.BytesIO(data)).convert("RGB")
+                processor(images=img, return_tensors="pt")
+            else:
+                img = decode_image(data, TARGET_SIZE, max_pixels=100_000_000)
+                preprocessor([img])
+            timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    return {
+        "mode": mode,
+        "images": len(timings),
+        "mean_ms": sum(timings) / len(timings),
+        "p50_ms": timings[len(timings) // 2],
+        "p95_ms": timings[min(len(timings) - 1, int(0.95 * len(timings)))],
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_delta_mb": peak_rss_mb() - baseline_rss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("images", nargs="*", help="Imagenes a usar (por defecto una JPEG sintetica)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--mode", choices=["legacy", "fast"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.images, args.repeats)))
+        return
+
+    print(f"{'mode':<8} {'images':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'peak RSS MB':>12} {'delta MB':>9}")
+    for mode in ("legacy", "fast"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--repeats", str(args.repeats), *args.images],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{r['mode']:<8} {r['images']:>6} {r['mean_ms']:>9.1f} {r['p50_ms']:>9.1f} "
+            f"{r['p95_ms']:>9.1f} {r['peak_rss_mb']:>12.1f} {r['peak_rss_delta_mb']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
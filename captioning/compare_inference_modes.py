@@ -0,0 +1,113 @@
+"""Compara latencia y calidad de los modos de inferencia de BLIP sobre un set fijo
+de imagenes locales. La referencia de calidad son los captions en fp32.
+
+    python compare_inference_modes.py imagenes/ --modes fp32,int8,bf16,int8+compile
+"""
+import argparse
+import json
+import os
+import time
+
+import torch
+from transformers import BlipProcessor
+
+from inference import load_caption_model
+from ingest import ImagePreprocessor, decode_image
+
+MODEL_NAME = os.getenv("CAPTION_MODEL", "Salesforce/blip-image-captioning-base")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def load_images(image_dir: str, size: tuple[int, int]) -> tuple[list[str], list]:
+    names = sorted(n for n in os.listdir(image_dir) if n.lower().endswith(IMAGE_EXTENSIONS))
+    images = []
+    for name in names:
+        with open(os.path.join(image_dir, name), "rb") as f:
+            images.append(decode_image(f.read(), size, max_pixels=200_000_000))
+    return names, images
+
+
+def token_f1(prediction: str, reference: str) -> float:
+    pred, ref = prediction.lower().split(), reference.lower().split()
+    if not pred or not ref:
+        return float(pred == ref)
+    common = sum(min(pred.count(t), ref.count(t)) for t in set(pred))
+    if common == 0:
+        return 0.0
+    precision, recall = common / len(pred), common / len(ref)
+    return 2 * precision * recall / (precision + recall)
+
+
+def run_mode(mode, processor, images, max_new_tokens, repeats):
+    load_start = time.perf_counter()
+    model, dtype = load_caption_model(MODEL_NAME, mode)
+    load_s = time.perf_counter() - load_start
+    preprocessor = ImagePreprocessor(processor.image_processor, max_batch_size=1)
+
+    with torch.no_grad():
+        # Warm-up: con torch.compile la primera llamada incluye la compilacion
+        warmup_start = time.perf_counter()
+        model.generate(pixel_values=preprocessor(images[:1]).to(dtype), max_new_tokens=max_new_tokens)
+        warmup_s = time.perf_counter() - warmup_start
+
+        captions, latencies = [], []
+        for img in images:
+            for _ in range(repeats):
+                start = time.perf_counter()
+                output = model.generate(pixel_values=preprocessor([img]).to(dtype), max_new_tokens=max_new_tokens)
+                latencies.append((time.perf_counter() - start) * 1000)
+            captions.append(processor.decode(output[0], skip_special_tokens=True))
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "load_s": load_s,
+        "warmup_s": warmup_s,
+        "mean_ms": sum(latencies) / len(latencies),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+        "captions": captions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("image_dir")
+    parser.add_argument("--modes", default="fp32,int8,bf16,compile")
+    parser.add_argument("--max-new-tokens", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="Guardar los resultados completos (captions incluidos) en JSON")
+    args = parser.parse_args()
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    if "fp32" in modes:
+        modes.remove("fp32")
+    modes.insert(0, "fp32")
+
+    processor = BlipProcessor.from_pretrained(MODEL_NAME)
+    size = (processor.image_processor.size["width"], processor.image_processor.size["height"])
+    names, images = load_images(args.image_dir, size)
+    if not images:
+        raise SystemExit(f"No images found in {args.image_dir}")
+
+    results = [run_mode(mode, processor, images, args.max_new_tokens, args.repeats) for mode in modes]
+    reference = results[0]["captions"]
+    baseline_ms = results[0]["mean_ms"]
+
+    print(f"{len(images)} images, {args.repeats} repeats each\n")
+    print(f"{'mode':<16} {'load s':>7} {'warmup s':>9} {'mean ms':>9} {'p95 ms':>9} {'speedup':>8} {'exact':>6} {'tok F1':>7}")
+    for r in results:
+        r["exact_match"] = sum(c == ref for c, ref in zip(r["captions"], reference)) / len(reference)
+        r["token_f1"] = sum(token_f1(c, ref) for c, ref in zip(r["captions"], reference)) / len(reference)
+        print(
+            f"{r['mode']:<16} {r['load_s']:>7.1f} {r['warmup_s']:>9.1f} {r['mean_ms']:>9.1f} "
+            f"{r['p95_ms']:>9.1f} {baseline_ms / r['mean_ms']:>7.2f}x {r['exact_match']:>6.2f} {r['token_f1']:>7.3f}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"images": names, "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
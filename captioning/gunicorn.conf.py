@@ -0,0 +1,40 @@
+"""Varios workers de captioning compartiendo los pesos de BLIP.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+Con preload_app el master importa main.py y carga el modelo una sola vez; los workers
+se crean con fork y comparten esas paginas (copy-on-write) mientras nadie las escriba.
+Cada worker hace su propio warm-up. La memoria por worker (RSS y PSS) esta en /stats.
+"""
+import os
+import shutil
+
+os.environ.setdefault("CAPTION_PRELOAD_MODEL", "1")
+# /metrics suma todos los workers: cada proceso escribe sus valores en este directorio.
+# Tiene que existir antes de que preload_app importe prometheus_client, y el master lo
+# vacia una sola vez (un HUP vuelve a ejecutar este archivo con los workers vivos)
+METRICS_DIR = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+if os.environ.get("PROMETHEUS_MULTIPROC_MASTER") != str(os.getpid()):
+    os.environ["PROMETHEUS_MULTIPROC_MASTER"] = str(os.getpid())
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+bind = f"0.0.0.0:{os.getenv('PORT', '3000')}"
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# La carga y el warm-up pueden tardar mas que el timeout por defecto de 30 s
+timeout = 300
+
+
+def post_worker_init(worker):
+    from memory import process_memory
+
+    print(f"Worker {worker.pid} iniciado: {process_memory()}")
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    # Saca los gauges livesum del worker que termino
+    multiprocess.mark_process_dead(worker.pid)
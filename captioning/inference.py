@@ -0,0 +1,50 @@
+import torch
+from transformers import BlipForConditionalGeneration
+
+# Modos combinables con "+", por ejemplo "int8+compile"
+INFERENCE_MODES = ("fp32", "int8", "bf16", "compile")
+
+
+def parse_inference_mode(mode: str) -> set[str]:
+    parts = {part.strip() for part in mode.lower().split("+") if part.strip()}
+    unknown = parts - set(INFERENCE_MODES)
+    if unknown:
+        raise ValueError(f"Unknown inference mode(s): {', '.join(sorted(unknown))}")
+    if {"int8", "bf16"} <= parts:
+        raise ValueError("int8 and bf16 inference modes are mutually exclusive")
+    return parts or {"fp32"}
+
+
+def bf16_supported() -> bool:
+    try:
+        return torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def load_caption_model(model_name: str, mode: str = "fp32"):
+    """Carga BLIP en el modo de inferencia pedido y devuelve (model, dtype de entrada)."""
+    parts = parse_inference_mode(mode)
+    # Con safetensors los pesos se mapean en memoria; low_cpu_mem_usage evita inicializar
+    # un modelo aleatorio y copiarle los pesos encima
+    model = BlipForConditionalGeneration.from_pretrained(model_name, low_cpu_mem_usage=True)
+    model.eval()
+    dtype = torch.float32
+
+    if "int8" in parts:
+        # Cuantizacion dinamica: pesos de las capas lineales en int8, activaciones en fp32
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    if "bf16" in parts:
+        if bf16_supported():
+            model = model.to(torch.bfloat16)
+            dtype = torch.bfloat16
+        else:
+            print("bf16 is not supported on this CPU, falling back to fp32.")
+
+    if "compile" in parts:
+        # generate() no se compila entero; se compilan los dos submodelos que hacen el trabajo
+        model.vision_model = torch.compile(model.vision_model)
+        model.text_decoder = torch.compile(model.text_decoder, dynamic=True)
+
+    return model, dtype
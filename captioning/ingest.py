@@ -0,0 +1,61 @@
+import io
+
+import numpy as np
+import torch
+from PIL import Image
+
+
+class ImageTooLargeError(ValueError):
+    pass
+
+
+def decode_image(data: bytes, target_size: tuple[int, int], max_pixels: int) -> Image.Image:
+    """Decodifica la imagen directamente a un tamaño cercano al del modelo.
+
+    Image.open solo lee el header, asi que las dimensiones se validan antes de
+    decodificar. En JPEG, draft() hace que libjpeg escale en el propio decode
+    (1/2, 1/4, 1/8) en vez de materializar los 12 MP completos.
+    """
+    img = Image.open(io.BytesIO(data))
+    width, height = img.size
+    if width * height > max_pixels:
+        raise ImageTooLargeError(f"Image has {width}x{height} pixels, limit is {max_pixels}.")
+
+    img.draft("RGB", target_size)
+    img = img.convert("RGB")
+    if img.size != target_size:
+        img = img.resize(target_size, Image.BICUBIC)
+    return img
+
+
+class ImagePreprocessor:
+    """Normaliza imagenes ya redimensionadas sobre un buffer NumPy preasignado.
+
+    Reemplaza a processor(images=...), que vuelve a redimensionar, reescalar y
+    normalizar creando varios arrays intermedios por imagen. El tensor que se
+    devuelve comparte memoria con el buffer (torch.from_numpy), por lo que solo
+    es valido hasta la siguiente llamada: el que llama debe serializar el uso.
+    """
+
+    def __init__(self, image_processor, max_batch_size: int):
+        size = image_processor.size
+        self.size = (size["width"], size["height"])
+        mean = np.asarray(image_processor.image_mean, dtype=np.float32).reshape(3, 1, 1)
+        std = np.asarray(image_processor.image_std, dtype=np.float32).reshape(3, 1, 1)
+        # (x * rescale - mean) / std == x * scale - offset
+        self.scale = np.float32(image_processor.rescale_factor) / std
+        self.offset = mean / std
+        self.buffer = np.empty((max_batch_size, 3, self.size[1], self.size[0]), dtype=np.float32)
+
+    def __call__(self, imgs: list[Image.Image]) -> torch.Tensor:
+        if len(imgs) > len(self.buffer):
+            self.buffer = np.empty((len(imgs),) + self.buffer.shape[1:], dtype=np.float32)
+
+        for i, img in enumerate(imgs):
+            if img.size != self.size:
+                img = img.resize(self.size, Image.BICUBIC)
+            pixels = np.asarray(img, dtype=np.uint8).transpose(2, 0, 1)
+            out = self.buffer[i]
+            np.multiply(pixels, self.scale, out=out)
+            np.subtract(out, self.offset, out=out)
+        return torch.from_numpy(self.buffer[: len(imgs)])
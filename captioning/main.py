@@ -1,36 +1,561 @@
+import time
+
+# Desde aca se mide la fase "import" del arranque (torch, fastapi, PIL, ...)
+IMPORT_START = time.perf_counter()
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import torch
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from transformers import BlipProcessor, BlipForConditionalGeneration
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from PIL import Image
 from pydantic import BaseModel
 from deep_translator import GoogleTranslator
 
+from ingest import ImagePreprocessor, ImageTooLargeError, decode_image
+from memory import process_memory, workers_memory
+from metrics import (
+    BATCH_SIZE,
+    CACHE_LOOKUPS,
+    QUEUE_DEPTH,
+    TOKENS_GENERATED,
+    install_request_tracing,
+    metrics_response,
+    request_id_var,
+    stage,
+)
+
+MODEL_NAME = os.getenv("CAPTION_MODEL", "Salesforce/blip-image-captioning-base")
+MAX_NEW_TOKENS = int(os.getenv("CAPTION_MAX_NEW_TOKENS", "50"))
+# fp32 | int8 | bf16 | compile (combinables con "+", ver inference.py)
+INFERENCE_MODE = os.getenv("CAPTION_INFERENCE_MODE", "fp32")
+# Micro-batching: se junta hasta BATCH_MAX_SIZE imagenes o se espera BATCH_MAX_WAIT_MS
+BATCH_MAX_SIZE = int(os.getenv("CAPTION_BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("CAPTION_BATCH_MAX_WAIT_MS", "20"))
+# Traduccion EN->ES: "google" (online) o "marian" (modelo local, sirve sin red)
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "google")
+TRANSLATION_MODEL = os.getenv("TRANSLATION_MODEL", "Helsinki-NLP/opus-mt-en-es")
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "4096"))
+TRANSLATION_CACHE_TTL_SECONDS = float(os.getenv("TRANSLATION_CACHE_TTL_SECONDS", "86400"))
+# Cache de captions por hash de la imagen decodificada
+CAPTION_CACHE_SIZE = int(os.getenv("CAPTION_CACHE_SIZE", "1024"))
+CAPTION_CACHE_POLICY = os.getenv("CAPTION_CACHE_POLICY", "lru")  # lru | fifo
+CAPTION_CACHE_DISK = os.getenv("CAPTION_CACHE_DISK", "0") == "1"
+CAPTION_CACHE_DIR = os.getenv("CAPTION_CACHE_DIR", os.path.join("outputs", "caption_cache"))
+CAPTION_CACHE_DISK_MAX_ENTRIES = int(os.getenv("CAPTION_CACHE_DISK_MAX_ENTRIES", "100000"))
+# Limites de ingesta: se rechaza antes de leer/decodificar todo el archivo
+MAX_UPLOAD_BYTES = int(os.getenv("CAPTION_MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.getenv("CAPTION_MAX_IMAGE_PIXELS", str(50_000_000)))
+# Carga los pesos al importar (en el master de gunicorn --preload, ver gunicorn.conf.py)
+PRELOAD_MODEL = os.getenv("CAPTION_PRELOAD_MODEL", "0") == "1"
+
 app = FastAPI()
+IMPORT_SECONDS = time.perf_counter() - IMPORT_START
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Server-Timing"],
 )
+install_request_tracing(app)
 
-class CaptionService:
+class GoogleTranslationBackend:
     def __init__(self):
-        self.processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-        self.model = BlipForConditionalGeneration.from_pretrained(
-            "Salesforce/blip-image-captioning-base"
-        )
         self.translator = GoogleTranslator(source='en', target='es')
 
+    def translate_batch(self, texts: list[str]) -> list[str]:
+        return self.translator.translate_batch(texts)
+
+
+class MarianTranslationBackend:
+    def __init__(self, model_name: str = TRANSLATION_MODEL):
+        from transformers import MarianMTModel, MarianTokenizer
+
+        self.tokenizer = MarianTokenizer.from_pretrained(model_name)
+        self.model = MarianMTModel.from_pretrained(model_name, low_cpu_mem_usage=True)
+        self.model.eval()
+
+    def translate_batch(self, texts: list[str]) -> list[str]:
+        inputs = self.tokenizer(texts, return_tensors="pt", padding=True)
+        with torch.no_grad():
+            output = self.model.generate(**inputs, max_new_tokens=64)
+        return self.tokenizer.batch_decode(output, skip_special_tokens=True)
+
+
+TRANSLATION_BACKENDS = {
+    "google": GoogleTranslationBackend,
+    "marian": MarianTranslationBackend,
+}
+
+
+class TranslationCache:
+    """LRU con TTL indexado por el caption en ingles."""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl_seconds:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: str):
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (value, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class CaptionTranslator:
+    def __init__(self, backend, cache: TranslationCache):
+        self.backend = backend
+        self.cache = cache
+
+    def translate_batch(self, texts: list[str]) -> list[str]:
+        results = [None] * len(texts)
+        pending = {}
+        for i, text in enumerate(texts):
+            cached = self.cache.get(text)
+            if cached is None:
+                pending.setdefault(text, []).append(i)
+            else:
+                results[i] = cached
+
+        # Solo se traducen los captions distintos que no estaban en cache
+        if pending:
+            unique = list(pending)
+            for text, translated in zip(unique, self.backend.translate_batch(unique)):
+                self.cache.put(text, translated)
+                for i in pending[text]:
+                    results[i] = translated
+        return results
+
+
+def build_translator(backend_name: str = TRANSLATION_BACKEND) -> CaptionTranslator:
+    if backend_name not in TRANSLATION_BACKENDS:
+        raise ValueError(f"Unknown translation backend: {backend_name}")
+    backend = TRANSLATION_BACKENDS[backend_name]()
+    cache = TranslationCache(TRANSLATION_CACHE_SIZE, TRANSLATION_CACHE_TTL_SECONDS)
+    return CaptionTranslator(backend, cache)
+
+
+class StartupState:
+    """Tiempos por fase del arranque y readiness del servicio."""
+
+    def __init__(self, import_seconds: float):
+        self.phases = {"import": round(import_seconds, 3)}
+        self.ready = threading.Event()
+        self.error = None
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        yield
+        self.phases[name] = round(time.perf_counter() - start, 3)
+        print(f"Startup {name}: {self.phases[name]:.2f}s")
+
+    def snapshot(self) -> dict:
+        status = "ready" if self.ready.is_set() else "error" if self.error else "loading"
+        return {"status": status, "error": self.error, "phases_s": dict(self.phases)}
+
+
+class CaptionService:
+    """Los pesos no se cargan al importar el modulo: load() corre en un hilo al arrancar
+    el servidor, asi /ready responde mientras tanto."""
+
+    def __init__(
+        self,
+        model_name: str = MODEL_NAME,
+        max_new_tokens: int = MAX_NEW_TOKENS,
+        inference_mode: str = INFERENCE_MODE,
+        translator: CaptionTranslator | None = None,
+    ):
+        self.model_name = model_name
+        self.max_new_tokens = max_new_tokens
+        self.inference_mode = inference_mode
+        self.translator = translator
+        self.processor = None
+        self.model = None
+        self.dtype = torch.float32
+        self.preprocessor = None
+        self.image_size = None
+        # El buffer del preprocessor se reutiliza entre batches
+        self.inference_lock = threading.Lock()
+
+    def load(self, startup: StartupState):
+        with startup.phase("import_models"):
+            from transformers import BlipProcessor
+
+            from inference import load_caption_model
+        with startup.phase("load"):
+            self.processor = BlipProcessor.from_pretrained(self.model_name)
+            self.model, self.dtype = load_caption_model(self.model_name, self.inference_mode)
+            self.translator = self.translator or build_translator()
+            self.preprocessor = ImagePreprocessor(self.processor.image_processor, BATCH_MAX_SIZE)
+            self.image_size = self.preprocessor.size
+
+    def warm_up(self, startup: StartupState):
+        with startup.phase("warmup"):
+            # Primer generate (y compilacion con torch.compile) antes de recibir pedidos
+            self.generate_captions_en([Image.new("RGB", self.image_size)])
+            if isinstance(self.translator.backend, MarianTranslationBackend):
+                self.translator.backend.translate_batch(["a photo of a dog"])
+
+    def generate_captions_en(self, imgs: list[Image.Image]) -> list[str]:
+        with self.inference_lock, torch.no_grad():
+            with stage("preprocess"):
+                pixel_values = self.preprocessor(imgs).to(self.dtype)
+            with stage("generate"):
+                output = self.model.generate(pixel_values=pixel_values, max_new_tokens=self.max_new_tokens)
+        pad_token_id = self.processor.tokenizer.pad_token_id
+        for tokens in (output != pad_token_id).sum(dim=1).tolist():
+            TOKENS_GENERATED.observe(tokens)
+        return self.processor.batch_decode(output, skip_special_tokens=True)
+
+    def generate_captions(self, imgs: list[Image.Image]) -> list[str]:
+        captions_en = self.generate_captions_en(imgs)
+        with stage("translation"):
+            return self.translator.translate_batch(captions_en)
+
     def generate_caption(self, img: Image.Image) -> str:
-        inputs = self.processor(images=img, return_tensors="pt")
-        output = self.model.generate(**inputs, max_new_tokens=50)
-        caption_en = self.processor.decode(output[0], skip_special_tokens=True)
-        caption_es = self.translator.translate(caption_en)
-        return caption_es
-    
+        return self.generate_captions([img])[0]
+
+
+class CaptionCache:
+    """Cache de captions direccionado por contenido: memoria acotada y, opcionalmente,
+    un nivel en disco que sobrevive reinicios.
+
+    La politica aplica a los dos niveles. En disco el orden lo da el mtime de cada archivo
+    (con lru un hit lo actualiza) y al pasar disk_max_entries se borran los mas viejos.
+    get/put son async: la E/S de disco corre en el threadpool, fuera del event loop.
+    """
+
+    POLICIES = ("lru", "fifo")
+    # Al desalojar en disco se baja hasta este porcentaje del maximo, asi el scan del
+    # directorio no se repite en cada put
+    DISK_EVICT_TARGET = 0.9
+
+    def __init__(self, max_size: int, policy: str = "lru", disk_dir: str | None = None,
+                 disk_max_entries: int = 100_000):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown caption cache policy: {policy}")
+        self.max_size = max_size
+        self.policy = policy
+        self.disk_dir = disk_dir
+        self.disk_max_entries = disk_max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.disk_lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.disk_entries = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self.disk_entries = sum(1 for name in os.listdir(disk_dir) if name.endswith(".json"))
+
+    @staticmethod
+    def key_for(img: Image.Image, *variant) -> str:
+        digest = hashlib.sha256()
+        digest.update(repr((img.mode, img.size, variant)).encode())
+        digest.update(img.tobytes())
+        return digest.hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
 
+    def _remember(self, key: str, caption: str):
+        self.entries[key] = caption
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def _read_disk(self, key: str) -> str | None:
+        path = self._disk_path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                caption = json.load(f)["caption"]
+        except (OSError, ValueError, KeyError):
+            return None
+        if self.policy == "lru":
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return caption
+
+    def _write_disk(self, key: str, caption: str):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            is_new = not os.path.exists(path)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"caption": caption}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Failed to write caption cache entry {path}: {e}")
+            return
+        if is_new:
+            with self.lock:
+                self.disk_entries += 1
+                over_limit = self.disk_entries > self.disk_max_entries
+            if over_limit:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        with self.disk_lock:
+            files = []
+            with os.scandir(self.disk_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".json"):
+                        try:
+                            files.append((entry.stat().st_mtime, entry.path))
+                        except OSError:
+                            pass
+            target = int(self.disk_max_entries * self.DISK_EVICT_TARGET)
+            files.sort()
+            removed = 0
+            for _, path in files[:max(0, len(files) - target)]:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+            with self.lock:
+                # El scan es la cuenta real (otro proceso pudo escribir o borrar)
+                self.disk_entries = len(files) - removed
+                self.disk_evictions += removed
+
+    async def get(self, key: str) -> str | None:
+        with self.lock:
+            if key in self.entries:
+                if self.policy == "lru":
+                    self.entries.move_to_end(key)
+                self.memory_hits += 1
+                return self.entries[key]
+
+        if self.disk_dir:
+            caption = await run_in_threadpool(self._read_disk, key)
+            if caption is not None:
+                with self.lock:
+                    self.disk_hits += 1
+                    if self.max_size > 0:
+                        self._remember(key, caption)
+                return caption
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    async def put(self, key: str, caption: str):
+        if self.max_size > 0:
+            with self.lock:
+                self._remember(key, caption)
+
+        if self.disk_dir:
+            await run_in_threadpool(self._write_disk, key, caption)
+
+    def snapshot(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "policy": self.policy,
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "disk_enabled": bool(self.disk_dir),
+            "disk_size": self.disk_entries,
+            "disk_max_size": self.disk_max_entries,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_evictions": self.disk_evictions,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+class BatchStats:
+    def __init__(self, window: int = 1000):
+        self.total_batches = 0
+        self.total_images = 0
+        self.sizes = deque(maxlen=window)
+        self.latencies_ms = deque(maxlen=window)
+
+    def record(self, size: int, latency_ms: float):
+        self.total_batches += 1
+        self.total_images += size
+        self.sizes.append(size)
+        self.latencies_ms.append(latency_ms)
+
+    def snapshot(self) -> dict:
+        latencies = sorted(self.latencies_ms)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        return {
+            "total_batches": self.total_batches,
+            "total_images": self.total_images,
+            "mean_batch_size": sum(self.sizes) / len(self.sizes) if self.sizes else 0.0,
+            "latency_ms_p50": percentile(0.50),
+            "latency_ms_p95": percentile(0.95),
+            "latency_ms_max": latencies[-1] if latencies else 0.0,
+        }
+
+
+class CaptionBatcher:
+    """Junta las imagenes que llegan en una ventana corta y las procesa en un solo
+    generate, en un hilo aparte para no bloquear el event loop."""
+
+    def __init__(self, service: CaptionService, max_batch_size: int, max_wait_ms: float):
+        self.service = service
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.stats = BatchStats()
+        # Un solo hilo: los generate no se pisan entre si
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        self.executor.shutdown(wait=False)
+
+    async def submit(self, img: Image.Image) -> str:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((img, future, request_id_var.get()))
+        # Gauge al cambiar la cola (ver metrics.py: /metrics suma todos los workers)
+        QUEUE_DEPTH.set(self.queue.qsize())
+        return await future
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        QUEUE_DEPTH.set(self.queue.qsize())
+        # Los requests cancelados (cliente desconectado) no se procesan
+        return [item for item in batch if not item[1].done()]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            try:
+                captions = await loop.run_in_executor(
+                    self.executor, self.service.generate_captions, [img for img, _, _ in batch]
+                )
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            latency_ms = (time.perf_counter() - start) * 1000
+            self.stats.record(len(batch), latency_ms)
+            BATCH_SIZE.observe(len(batch))
+            request_ids = ",".join(request_id for _, _, request_id in batch)
+            print(f"Caption batch: size={len(batch)} latency={latency_ms:.1f}ms requests={request_ids}")
+
+            for (_, future, _), caption in zip(batch, captions):
+                if not future.done():
+                    future.set_result(caption)
+
+
+startup = StartupState(IMPORT_SECONDS)
 caption_service = CaptionService()
+caption_batcher = CaptionBatcher(caption_service, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+if PRELOAD_MODEL:
+    # Antes del fork: los workers heredan los pesos copy-on-write en vez de cargar su copia.
+    # El warm-up si corre en cada worker (los hilos de torch no sobreviven al fork).
+    caption_service.load(startup)
+caption_cache = CaptionCache(
+    CAPTION_CACHE_SIZE,
+    CAPTION_CACHE_POLICY,
+    CAPTION_CACHE_DIR if CAPTION_CACHE_DISK else None,
+    CAPTION_CACHE_DISK_MAX_ENTRIES,
+)
+
+
+def load_models():
+    try:
+        if caption_service.model is None:
+            caption_service.load(startup)
+        caption_service.warm_up(startup)
+    except Exception as e:
+        startup.error = str(e)
+        print(f"Error loading caption model: {e}")
+        return
+    startup.ready.set()
+    print(f"Captioning ready: {startup.phases}")
+
+
+@app.on_event("startup")
+async def start_batcher():
+    threading.Thread(target=load_models, name="caption-loader", daemon=True).start()
+    caption_batcher.start()
+
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    await caption_batcher.stop()
 
 
 class CaptionResponse(BaseModel):
@@ -39,14 +564,72 @@ class CaptionResponse(BaseModel):
 
 @app.post("/caption", response_model=CaptionResponse)
 async def caption_image(file: UploadFile = File(...)):
+    if not startup.ready.is_set():
+        raise HTTPException(status_code=503, detail="Caption model is still loading.")
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Image file too large.")
+    with stage("upload_read"):
+        data = await file.read(MAX_UPLOAD_BYTES + 1)
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Image file too large.")
+
     try:
-        img = Image.open(file.file).convert("RGB")
+        with stage("decode"):
+            img = await run_in_threadpool(
+                decode_image, data, caption_service.image_size, MAX_IMAGE_PIXELS
+            )
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception:
         raise HTTPException(status_code=400, detail="File not valid as image.")
-    
+
+    cache_key = CaptionCache.key_for(
+        img,
+        caption_service.model_name,
+        caption_service.inference_mode,
+        caption_service.max_new_tokens,
+        TRANSLATION_BACKEND,
+    )
+    caption_es = await caption_cache.get(cache_key)
+    CACHE_LOOKUPS.labels("hit" if caption_es is not None else "miss").inc()
+    if caption_es is not None:
+        return CaptionResponse(caption=caption_es)
+
     try:
-        caption_es = caption_service.generate_caption(img)
+        with stage("queue_and_inference"):
+            caption_es = await caption_batcher.submit(img)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error while generating caption: {str(e)}")
-    
+
+    await caption_cache.put(cache_key, caption_es)
     return CaptionResponse(caption=caption_es)
+
+
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
+
+
+@app.get("/ready")
+async def ready():
+    # 200 solo con el modelo cargado y caliente; sirve como readinessProbe / healthcheck
+    return JSONResponse(startup.snapshot(), status_code=200 if startup.ready.is_set() else 503)
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "startup": startup.snapshot(),
+        "memory": workers_memory() if PRELOAD_MODEL else process_memory(),
+        "inference_mode": caption_service.inference_mode,
+        "batching": {
+            "max_batch_size": caption_batcher.max_batch_size,
+            "max_wait_ms": caption_batcher.max_wait * 1000,
+            **caption_batcher.stats.snapshot(),
+        },
+        "cache": caption_cache.snapshot(),
+        "translation": {
+            "backend": TRANSLATION_BACKEND,
+            **(caption_service.translator.cache.snapshot() if caption_service.translator else {}),
+        },
+    }
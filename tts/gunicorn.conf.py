@@ -0,0 +1,46 @@
+"""Varios workers de TTS compartiendo un solo Kokoro cargado antes del fork.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+preload_app importa main.py en el master con TTS_PRELOAD_MODEL=1: los pesos quedan en
+paginas compartidas copy-on-write y cada worker solo hace el warm-up. /stats muestra
+RSS y PSS de cada worker.
+
+Con TTS_AUDIO_STORE=disk los workers comparten outputs/: el archivo de cada frase sale
+de la clave (cualquier worker lo encuentra y lo sirve) y el indice se guarda mezclado bajo
+un lock de archivo (ver AudioCache). Con TTS_AUDIO_STORE=memory el audio vive en el
+proceso que lo sintetizo y /audio daria 404 en los demas, asi que requiere un solo worker.
+"""
+import os
+import shutil
+
+os.environ.setdefault("TTS_PRELOAD_MODEL", "1")
+# /metrics suma todos los workers: cada proceso escribe sus valores en este directorio.
+# Tiene que existir antes de que preload_app importe prometheus_client, y el master lo
+# vacia una sola vez (un HUP vuelve a ejecutar este archivo con los workers vivos)
+METRICS_DIR = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+if os.environ.get("PROMETHEUS_MULTIPROC_MASTER") != str(os.getpid()):
+    os.environ["PROMETHEUS_MULTIPROC_MASTER"] = str(os.getpid())
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8002')}"
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+if workers > 1 and os.getenv("TTS_AUDIO_STORE", "disk") == "memory":
+    raise ValueError("TTS_AUDIO_STORE=memory keeps audio per process; use GUNICORN_WORKERS=1 or the disk store")
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 300
+
+
+def post_worker_init(worker):
+    from memory import process_memory
+
+    print(f"Worker {worker.pid} iniciado: {process_memory()}")
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    # Saca los gauges livesum del worker que termino
+    multiprocess.mark_process_dead(worker.pid)
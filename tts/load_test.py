@@ -0,0 +1,74 @@
+"""Prueba de carga para /tts: mide throughput y latencia con 1, 8 y 32 clientes.
+
+Cada request usa un texto distinto para que el cache de frases no responda por el
+modelo (usar --cached para medir justamente el camino del cache).
+
+    python load_test.py --url http://localhost:8002 --requests 64
+"""
+import argparse
+import json
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_TEXT = "Una persona sentada en un banco mirando el mar"
+
+
+def post_tts(url: str, text: str, timeout: float) -> tuple[int, float]:
+    body = json.dumps({"text": text, "voice": "bm_fable", "speed": 1.0}).encode("utf-8")
+    req = urllib.request.Request(f"{url}/tts", data=body, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, TimeoutError):
+        status = 0
+    return status, (time.perf_counter() - start) * 1000
+
+
+def run_level(url: str, clients: int, total: int, cached: bool, timeout: float) -> dict:
+    run_id = uuid.uuid4().hex[:6]
+    texts = [BASE_TEXT if cached else f"{BASE_TEXT}, prueba {run_id} numero {i}" for i in range(total)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(lambda t: post_tts(url, t, timeout), texts))
+    elapsed = time.perf_counter() - start
+
+    ok = sorted(latency for status, latency in results if status == 200)
+    return {
+        "clients": clients,
+        "ok": len(ok),
+        "rejected": sum(1 for status, _ in results if status == 429),
+        "errors": sum(1 for status, _ in results if status not in (200, 429)),
+        "throughput": len(ok) / elapsed,
+        "p50_ms": ok[len(ok) // 2] if ok else 0.0,
+        "p95_ms": ok[min(len(ok) - 1, int(0.95 * len(ok)))] if ok else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8002")
+    parser.add_argument("--clients", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=64, help="Requests por nivel de concurrencia")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--cached", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'clients':>7} {'ok':>5} {'429':>5} {'errors':>6} {'req/s':>7} {'p50 ms':>9} {'p95 ms':>9}")
+    for clients in (int(c) for c in args.clients.split(",")):
+        r = run_level(args.url, clients, args.requests, args.cached, args.timeout)
+        print(
+            f"{r['clients']:>7} {r['ok']:>5} {r['rejected']:>5} {r['errors']:>6} "
+            f"{r['throughput']:>7.2f} {r['p50_ms']:>9.0f} {r['p95_ms']:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
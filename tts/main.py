@@ -1,37 +1,446 @@
-from fastapi import FastAPI, HTTPException
+import time
+
+# Inicio de la fase "import" del arranque
+IMPORT_START = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
+import asyncio
+import contextvars
+import fcntl
 import os
 import glob
-import uuid
-import time
+import hashlib
+import io
+import json
+import re
+import struct
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
 import soundfile as sf
 import numpy as np
-from kokoro import KPipeline
+
+from memory import process_memory, workers_memory
+from metrics import (
+    AUDIO_SECONDS,
+    BATCH_ITEMS,
+    CACHE_LOOKUPS,
+    POOL_IN_FLIGHT,
+    POOL_QUEUED,
+    POOL_REJECTED,
+    install_request_tracing,
+    metrics_response,
+    observe_stage,
+    stage,
+)
 
 app = FastAPI()
+IMPORT_SECONDS = time.perf_counter() - IMPORT_START
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Server-Timing"],
 )
+install_request_tracing(app)
 
 OUTPUT_DIR = "outputs"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+SAMPLE_RATE = 24000
+# Cache de frases: tope de espacio en disco para outputs/ (LRU por tamaño)
+CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Fuera de lo que sirve /audio, pero dentro del volumen de outputs/ para que persista
+CACHE_INDEX_PATH = os.path.join(OUTPUT_DIR, ".cache", "index.json")
+LEGACY_INDEX_PATH = os.path.join(OUTPUT_DIR, "index.json")
+# "disk": WAVs en outputs/ (cache persistente) | "memory": bytes en RAM con TTL, sin disco
+AUDIO_STORE = os.getenv("TTS_AUDIO_STORE", "disk")
+MEMORY_MAX_BYTES = int(os.getenv("TTS_MEMORY_MAX_BYTES", str(128 * 1024 * 1024)))
+MEMORY_TTL_SECONDS = float(os.getenv("TTS_MEMORY_TTL_SECONDS", "600"))
+AUDIO_CACHE_CONTROL = f"public, max-age={int(MEMORY_TTL_SECONDS)}"
+CLEANUP_INTERVAL_SECONDS = float(os.getenv("TTS_CLEANUP_INTERVAL_SECONDS", "30"))
+# Pool de sintesis: TTS_WORKERS hilos y hasta TTS_QUEUE_SIZE pedidos esperando
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "1"))
+TTS_QUEUE_SIZE = int(os.getenv("TTS_QUEUE_SIZE", "16"))
+BATCH_MAX_ITEMS = int(os.getenv("TTS_BATCH_MAX_ITEMS", "64"))
+# Carga Kokoro al importar, en el master de gunicorn --preload (ver gunicorn.conf.py)
+PRELOAD_MODEL = os.getenv("TTS_PRELOAD_MODEL", "0") == "1"
+
+
+def wav_stream_header(sample_rate: int = SAMPLE_RATE, channels: int = 1, bits: int = 16) -> bytes:
+    # Header WAV con tamaños "desconocidos" (0xFFFFFFFF) para poder mandar el PCM
+    # a medida que se genera, sin saber de antemano cuanto audio va a haber
+    block_align = channels * bits // 8
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 0xFFFFFFFF, b"WAVE",
+        b"fmt ", 16, 1, channels, sample_rate, sample_rate * block_align, block_align, bits,
+        b"data", 0xFFFFFFFF,
+    )
+
+
+def normalize_text(text: str) -> str:
+    # Se conservan los saltos de linea porque Kokoro segmenta por ellos
+    text = unicodedata.normalize("NFC", text)
+    lines = (re.sub(r"[ \t]+", " ", line).strip() for line in text.split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+class AudioCache:
+    """Cache de audios sintetizados indexado por (texto normalizado, voz, velocidad, idioma).
+
+    El indice se persiste en outputs/.cache/index.json y cuando se supera max_bytes se borran
+    los archivos usados hace mas tiempo.
+
+    Varios workers de gunicorn pueden compartir el mismo directorio: el nombre del archivo
+    sale de la clave, asi que un miss busca primero si otro worker ya lo escribio, y save()
+    mezcla el indice en disco con el propio bajo un lock de archivo en vez de pisarlo. Cada
+    entrada guarda cuando se uso por ultima vez, asi todos desalojan en el mismo orden.
+    """
+
+    def __init__(self, output_dir: str, index_path: str, max_bytes: int):
+        self.output_dir = output_dir
+        self.index_path = index_path
+        self.lock_path = f"{index_path}.lock"
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> {"filename", "size", "used"}, del menos al mas usado
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dirty = False
+        self._load()
+
+    @staticmethod
+    def key_for(text: str, voice: str, speed: float, lang_code: str) -> str:
+        payload = json.dumps([normalize_text(text), voice, round(speed, 3), lang_code], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def filename_for(key: str) -> str:
+        # Nombre derivado de la clave: el mismo texto siempre termina en el mismo archivo
+        return f"{key[:32]}.wav"
+
+    def path_for(self, filename: str) -> str:
+        return os.path.join(self.output_dir, filename)
+
+    @contextmanager
+    def _index_lock(self):
+        # flock entre procesos: los workers no se pisan el index.json ni leen uno a medio escribir
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_index(self) -> list:
+        """Entradas del indice en disco cuyo archivo sigue existiendo."""
+        entries = []
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, encoding="utf-8") as f:
+                    entries = json.load(f)["entries"]
+            except (OSError, ValueError, KeyError) as e:
+                # Se reconstruye con lo que tenga este proceso en el proximo save
+                print(f"Ignoring unreadable TTS cache index {self.index_path}: {e}")
+        return [entry for entry in entries if os.path.exists(self.path_for(entry["filename"]))]
+
+    def _load(self):
+        with self._index_lock():
+            for entry in self._read_index():
+                self.entries[entry["key"]] = {
+                    "filename": entry["filename"],
+                    "size": entry["size"],
+                    "used": entry.get("used", 0.0),
+                }
+                self.total_bytes += entry["size"]
+
+            # Los audios que no estan en el indice (por ejemplo los uuid de antes) se borran.
+            # Con gunicorn --preload esto corre una sola vez, en el master
+            known = {entry["filename"] for entry in self.entries.values()}
+            for path in glob.glob(os.path.join(self.output_dir, "*.wav")):
+                if os.path.basename(path) not in known:
+                    self._remove_file(path)
+
+        self.save()
+
+    def save(self):
+        """Mezcla el indice en disco (lo que guardaron los otros workers) con el propio,
+        desaloja sobre el resultado y lo guarda, todo bajo el lock de archivo. El indice
+        en memoria queda igual al guardado, asi el tope de bytes cuenta todo el directorio."""
+        try:
+            with self._index_lock():
+                on_disk = self._read_index()
+                with self.lock:
+                    mine = list(self.entries.items())
+                checked = {key for key, _ in mine}
+                # Las entradas propias cuyo archivo borro otro worker tampoco se guardan
+                mine = [(key, entry) for key, entry in mine if os.path.exists(self.path_for(entry["filename"]))]
+
+                with self.lock:
+                    merged = {
+                        entry["key"]: {"filename": entry["filename"], "size": entry["size"], "used": entry.get("used", 0.0)}
+                        for entry in on_disk
+                    }
+                    for key, entry in mine:
+                        if key not in merged or merged[key]["used"] < entry["used"]:
+                            merged[key] = entry
+                    # Lo que se agrego mientras se leia el disco no se pierde
+                    for key, entry in self.entries.items():
+                        if key not in checked:
+                            merged[key] = entry
+                    self.entries = OrderedDict(sorted(merged.items(), key=lambda item: item[1]["used"]))
+                    self.total_bytes = sum(entry["size"] for entry in self.entries.values())
+                    evicted = self._evict_locked()
+                    entries = [{"key": key, **entry} for key, entry in self.entries.items()]
+                    self.dirty = False
+
+                for filename in evicted:
+                    self._remove_file(self.path_for(filename))
+                tmp_path = f"{self.index_path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"entries": entries}, f)
+                os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Failed to save TTS cache index: {e}")
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+            print(f"Deleted audio file: {path}")
+        except OSError as e:
+            print(f"Failed to delete {path}: {e}")
+
+    def _evict_locked(self) -> list:
+        evicted = []
+        # Nunca se borra la ultima entrada agregada, aunque sola supere el tope
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, entry = self.entries.popitem(last=False)
+            self.total_bytes -= entry["size"]
+            self.evictions += 1
+            evicted.append(entry["filename"])
+        return evicted
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and os.path.exists(self.path_for(entry["filename"])):
+                self.entries.move_to_end(key)
+                entry["used"] = time.time()
+                self.hits += 1
+                self.dirty = True
+                return entry["filename"]
+            if entry is not None:
+                # El archivo ya no esta: la entrada sale tambien del indice persistido
+                del self.entries[key]
+                self.total_bytes -= entry["size"]
+                self.dirty = True
+            filename = self.filename_for(key)
+            try:
+                # Lo sintetizo otro worker y todavia no esta en nuestro indice
+                size = os.path.getsize(self.path_for(filename))
+            except OSError:
+                self.misses += 1
+                return None
+            self.entries[key] = {"filename": filename, "size": size, "used": time.time()}
+            self.total_bytes += size
+            self.dirty = True
+            self.hits += 1
+            return filename
+
+    def store(self, key: str, filename: str, data: bytes):
+        path = self.path_for(filename)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.put(key, filename)
+
+    def put(self, key: str, filename: str):
+        size = os.path.getsize(self.path_for(filename))
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous["size"]
+            self.entries[key] = {"filename": filename, "size": size, "used": time.time()}
+            self.total_bytes += size
+            self.dirty = True
+
+    def maintain(self):
+        """Desalojo por tamaño y guardado del indice; corre periodicamente fuera del
+        camino de los requests."""
+        if self.dirty or self.total_bytes > self.max_bytes:
+            self.save()
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class MemoryAudioCache:
+    """Mismo contrato que AudioCache pero guardando los WAV en memoria, acotado por
+    bytes totales (LRU) y con TTL. No toca el disco."""
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()  # key -> {"filename", "data", "etag", "created"}
+        self.by_filename = {}
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop(self, key: str):
+        entry = self.entries.pop(key)
+        self.by_filename.pop(entry["filename"], None)
+        self.total_bytes -= len(entry["data"])
+
+    def _live(self, key: str | None) -> dict | None:
+        entry = self.entries.get(key) if key is not None else None
+        if entry is not None and time.monotonic() - entry["created"] > self.ttl_seconds:
+            self._drop(key)
+            return None
+        return entry
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            entry = self._live(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry["filename"]
+
+    def read(self, filename: str) -> tuple[bytes, str] | None:
+        with self.lock:
+            entry = self._live(self.by_filename.get(filename))
+            if entry is None:
+                return None
+            return entry["data"], entry["etag"]
+
+    def store(self, key: str, filename: str, data: bytes):
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = {
+                "filename": filename,
+                "data": data,
+                "etag": f'"{hashlib.md5(data).hexdigest()}"',
+                "created": time.monotonic(),
+            }
+            self.by_filename[filename] = key
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def maintain(self):
+        with self.lock:
+            for key in list(self.entries):
+                self._live(key)
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def build_audio_cache(store: str = AUDIO_STORE):
+    if store == "memory":
+        return MemoryAudioCache(MEMORY_MAX_BYTES, MEMORY_TTL_SECONDS)
+    if store == "disk":
+        # El indice de versiones anteriores estaba en outputs/ y se podia pedir por /audio
+        if os.path.exists(LEGACY_INDEX_PATH) and not os.path.exists(CACHE_INDEX_PATH):
+            os.makedirs(os.path.dirname(CACHE_INDEX_PATH), exist_ok=True)
+            os.replace(LEGACY_INDEX_PATH, CACHE_INDEX_PATH)
+        return AudioCache(OUTPUT_DIR, CACHE_INDEX_PATH, CACHE_MAX_BYTES)
+    raise ValueError(f"Unknown audio store: {store}")
+
+
+class StartupState:
+    """Fases del arranque en segundos (import, carga, warm-up) y si ya se puede sintetizar."""
+
+    def __init__(self, import_seconds: float):
+        self.phases = {"import": round(import_seconds, 3)}
+        self.ready = threading.Event()
+        self.error = None
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        yield
+        self.phases[name] = round(time.perf_counter() - start, 3)
+        print(f"Startup {name}: {self.phases[name]:.2f}s")
+
+    def snapshot(self) -> dict:
+        status = "ready" if self.ready.is_set() else "error" if self.error else "loading"
+        return {"status": status, "error": self.error, "phases_s": dict(self.phases)}
+
+
+class ModelLoadingError(RuntimeError):
+    pass
+
 
 class TTSService:
     def __init__(self, lang_code: str = "e"):
-        self.pipeline = KPipeline(lang_code=lang_code)
+        self.lang_code = lang_code
+        # Kokoro se carga en load(); el cache de audio ya responde mientras tanto
+        self.pipeline = None
         self.output_dir = OUTPUT_DIR
+        self.cache = build_audio_cache()
 
-    def generate_audio(self, text: str, voice: str = "bm_fable", speed: float = 1.0) -> str:
-        filename = f"{uuid.uuid4()}.wav"
-        output_path = os.path.join(self.output_dir, filename)
+    def load(self, startup: StartupState):
+        with startup.phase("import_models"):
+            from kokoro import KPipeline
+        with startup.phase("load"):
+            self.pipeline = KPipeline(lang_code=self.lang_code)
+
+    def warm_up(self, startup: StartupState, voice: str = "bm_fable"):
+        with startup.phase("warmup"):
+            # Carga la voz por defecto y hace la primera inferencia; el audio se descarta
+            for _ in self.iter_audio("Hola.", voice):
+                pass
 
+    def cached_audio(self, text: str, voice: str = "bm_fable", speed: float = 1.0) -> str | None:
+        filename = self.cache.get(AudioCache.key_for(text, voice, speed, self.lang_code))
+        CACHE_LOOKUPS.labels("hit" if filename is not None else "miss").inc()
+        return filename
+
+    def iter_audio(self, text: str, voice: str = "bm_fable", speed: float = 1.0):
+        """Devuelve cada segmento de audio (PCM int16) apenas Kokoro lo genera."""
+        if self.pipeline is None:
+            raise ModelLoadingError("TTS model is still loading")
         generator = self.pipeline(
             text,
             voice=voice,
@@ -40,23 +449,198 @@ class TTSService:
         )
 
         for gs, ps, audio in generator:
+            if audio is None:
+                continue
             audio_np = audio.detach().cpu().numpy()
-            audio_int16 = (audio_np * 32767).astype(np.int16)
-            sf.write(output_path, audio_int16, 24000, subtype="PCM_16")
-            break  # solo el primer chunk
+            yield (np.clip(audio_np, -1.0, 1.0) * 32767).astype(np.int16)
+
+    def generate_audio(self, text: str, voice: str = "bm_fable", speed: float = 1.0) -> str:
+        cached = self.cached_audio(text, voice, speed)
+        if cached is not None:
+            return cached
+        return self.synthesize(text, voice, speed)
+
+    def synthesize(self, text: str, voice: str = "bm_fable", speed: float = 1.0) -> str:
+        with stage("synthesis"):
+            chunks = list(self.iter_audio(text, voice, speed))
+        if not chunks:
+            raise ValueError("No audio generated for the given text")
 
+        return self.store_audio(text, voice, speed, np.concatenate(chunks))
+
+    def store_audio(self, text: str, voice: str, speed: float, audio_int16: np.ndarray) -> str:
+        key = AudioCache.key_for(text, voice, speed, self.lang_code)
+        filename = AudioCache.filename_for(key)
+
+        AUDIO_SECONDS.observe(len(audio_int16) / SAMPLE_RATE)
+        with stage("audio_encode"):
+            buffer = io.BytesIO()
+            sf.write(buffer, audio_int16, SAMPLE_RATE, subtype="PCM_16", format="WAV")
+        with stage("file_write"):
+            self.cache.store(key, filename, buffer.getvalue())
         return filename
 
-    def cleanup_old_files(self, max_age_seconds: int = 300):
-        files = glob.glob(os.path.join(self.output_dir, "*.wav"))
-        now = time.time()
-        for f in files:
-            if now - os.path.getmtime(f) > max_age_seconds:
+
+class PoolSaturatedError(RuntimeError):
+    pass
+
+
+class SynthesisPool:
+    """Pool acotado de hilos para la sintesis. Si ya hay workers + queue_size pedidos
+    en curso, los nuevos se rechazan en vez de encolarse sin limite."""
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, queue_size)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tts")
+        self.in_flight = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                POOL_REJECTED.inc()
+                raise PoolSaturatedError("TTS service is saturated, retry later")
+            self.in_flight += 1
+            self._report()
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+            self._report()
+
+    def _report(self):
+        # Los gauges se actualizan al cambiar (no al scrapear): con varios workers de
+        # gunicorn /metrics suma el ultimo valor que escribio cada proceso
+        POOL_IN_FLIGHT.set(self.in_flight)
+        POOL_QUEUED.set(max(0, self.in_flight - self.workers))
+
+    async def run(self, fn, *args):
+        self.acquire()
+        submitted = time.perf_counter()
+
+        def call():
+            observe_stage("queue_wait", time.perf_counter() - submitted)
+            return fn(*args)
+
+        # El hilo del pool corre con el contexto del pedido (request ID y etapas)
+        context = contextvars.copy_context()
+        try:
+            return await asyncio.wrap_future(self.executor.submit(context.run, call))
+        finally:
+            self.release()
+
+    async def run_many(self, fn, args_list: list) -> list:
+        """Corre fn(*args) para cada elemento con un solo lugar de admision y como mucho
+        `workers` trabajos del lote en el executor a la vez, asi los pedidos de /tts que
+        llegan despues se intercalan entre los items en vez de esperar el lote entero.
+
+        Devuelve el resultado o la excepcion de cada item, en el mismo orden.
+        """
+        self.acquire()
+        results = [None] * len(args_list)
+        pending = iter(range(len(args_list)))
+        context = contextvars.copy_context()
+
+        async def lane():
+            for i in pending:
+                submitted = time.perf_counter()
+
+                def call(args=args_list[i], submitted=submitted):
+                    observe_stage("queue_wait", time.perf_counter() - submitted)
+                    return fn(*args)
+
                 try:
-                    os.remove(f)
-                    print(f"Deleted old audio file: {f}")
+                    results[i] = await asyncio.wrap_future(self.executor.submit(context.copy().run, call))
                 except Exception as e:
-                    print(f"Failed to delete {f}: {e}")
+                    results[i] = e
+
+        try:
+            await asyncio.gather(*(lane() for _ in range(min(self.workers, len(args_list)))))
+        finally:
+            self.release()
+        return results
+
+    def stream(self, fn, *args, max_buffered: int = 8, stall_seconds: float = 30.0):
+        """Corre el generador fn(*args) en un hilo del pool y devuelve un async iterator
+        con sus items. Asi el streaming ocupa un worker como cualquier sintesis.
+
+        El lugar se toma aca (PoolSaturatedError sale antes de empezar la respuesta) y se
+        libera cuando termina el generador; si el cliente corta, el generador se detiene
+        en el siguiente item.
+        """
+        self.acquire()
+        loop = asyncio.get_running_loop()
+        items = asyncio.Queue(maxsize=max_buffered)
+        cancelled = threading.Event()
+        done = object()
+        submitted = time.perf_counter()
+
+        def put(item) -> bool:
+            # Bloquea el hilo del pool mientras la cola esta llena (backpressure). Si nadie
+            # consume por stall_seconds (la respuesta nunca arranco) se abandona la sintesis
+            future = asyncio.run_coroutine_threadsafe(items.put(item), loop)
+            deadline = time.monotonic() + stall_seconds
+            while not cancelled.is_set() and time.monotonic() < deadline:
+                try:
+                    future.result(timeout=0.1)
+                    return True
+                except FutureTimeoutError:
+                    continue
+            future.cancel()
+            return False
+
+        def produce():
+            observe_stage("queue_wait", time.perf_counter() - submitted)
+            try:
+                for item in fn(*args):
+                    if not put(item):
+                        return
+                put(done)
+            except Exception as e:
+                put(e)
+            finally:
+                self.release()
+
+        context = contextvars.copy_context()
+        try:
+            self.executor.submit(context.run, produce)
+        except RuntimeError:
+            self.release()
+            raise
+
+        async def consume():
+            try:
+                while True:
+                    item = await items.get()
+                    if item is done:
+                        return
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                cancelled.set()
+
+        return consume()
+
+    def snapshot(self) -> dict:
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.workers),
+            "rejected": self.rejected,
+        }
+
+
+def loading_response() -> HTTPException:
+    return HTTPException(status_code=503, detail="TTS model is still loading.", headers={"Retry-After": "5"})
+
+
+def saturated_response(e: PoolSaturatedError) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
 
 
 class TTSRequest(BaseModel):
@@ -70,26 +654,264 @@ class TTSResponse(BaseModel):
     audio_url: str
 
 
+class TTSBatchItem(BaseModel):
+    text: str
+    voice: str | None = None
+    speed: float | None = None
+
+
+class TTSBatchRequest(BaseModel):
+    items: list[TTSBatchItem]
+    # Valores por defecto para los items que no indican voz o velocidad
+    voice: str = "bm_fable"
+    speed: float = 1.0
+
+
+class TTSBatchResult(BaseModel):
+    # URLs si el item se sintetizo (o estaba en cache); error si fallo solo ese item
+    internal_url: str | None = None
+    audio_url: str | None = None
+    error: str | None = None
+
+
+class TTSBatchResponse(BaseModel):
+    items: list[TTSBatchResult]
+
+
+def audio_urls(filename: str) -> TTSResponse:
+    internal_url = f"http://tts:8002/audio/{filename}"
+    public_url = f"http://localhost:8002/audio/{filename}"
+
+    return TTSResponse(internal_url=internal_url, audio_url=public_url)
+
+
+startup = StartupState(IMPORT_SECONDS)
 tts_service = TTSService(lang_code="e")
+synthesis_pool = SynthesisPool(TTS_WORKERS, TTS_QUEUE_SIZE)
+if PRELOAD_MODEL:
+    # Los workers heredan los pesos por fork (copy-on-write); el warm-up queda para cada uno
+    tts_service.load(startup)
+
+
+async def cleanup_loop():
+    while True:
+        await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
+        try:
+            await run_in_threadpool(tts_service.cache.maintain)
+        except Exception as e:
+            print(f"TTS cache maintenance failed: {e}")
+
+
+def load_model():
+    try:
+        if tts_service.pipeline is None:
+            tts_service.load(startup)
+        tts_service.warm_up(startup)
+    except Exception as e:
+        startup.error = str(e)
+        print(f"Error loading TTS model: {e}")
+        return
+    startup.ready.set()
+    print(f"TTS ready: {startup.phases}")
+
+
+@app.on_event("startup")
+async def start_cleanup():
+    threading.Thread(target=load_model, name="tts-loader", daemon=True).start()
+    app.state.cleanup_task = asyncio.create_task(cleanup_loop())
 
 
 @app.post("/tts", response_model=TTSResponse)
 async def generate_tts(request: TTSRequest):
     try:
-        filename = tts_service.generate_audio(request.text, request.voice, request.speed)
-        tts_service.cleanup_old_files()
+        # Los aciertos del cache no ocupan lugar en el pool
+        filename = tts_service.cached_audio(request.text, request.voice, request.speed)
+        if filename is None:
+            filename = await synthesis_pool.run(
+                tts_service.synthesize, request.text, request.voice, request.speed
+            )
+    except PoolSaturatedError as e:
+        raise saturated_response(e)
+    except ModelLoadingError:
+        raise loading_response()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating audio: {str(e)}")
 
-    internal_url = f"http://tts:8002/audio/{filename}"
-    public_url = f"http://localhost:8002/audio/{filename}"
+    return audio_urls(filename)
 
-    return TTSResponse(internal_url=internal_url, audio_url=public_url)
 
+@app.post("/tts/batch", response_model=TTSBatchResponse)
+async def generate_tts_batch(request: TTSBatchRequest):
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch.")
+
+    items = [
+        (item.text, item.voice or request.voice, item.speed if item.speed is not None else request.speed)
+        for item in request.items
+    ]
+    BATCH_ITEMS.observe(len(items))
+    results = [tts_service.cached_audio(*item) for item in items]
+    # Los textos repetidos dentro del lote se sintetizan una sola vez
+    missing = {}
+    for i, filename in enumerate(results):
+        if filename is None:
+            missing.setdefault(AudioCache.key_for(*items[i], tts_service.lang_code), []).append(i)
+    if missing:
+        if not startup.ready.is_set():
+            raise loading_response()
+        try:
+            generated = await synthesis_pool.run_many(
+                tts_service.synthesize, [items[indices[0]] for indices in missing.values()]
+            )
+        except PoolSaturatedError as e:
+            raise saturated_response(e)
+        for indices, result in zip(missing.values(), generated):
+            for i in indices:
+                results[i] = result
+
+    return TTSBatchResponse(items=[batch_result(result) for result in results])
+
+
+def batch_result(result) -> TTSBatchResult:
+    if isinstance(result, Exception):
+        return TTSBatchResult(error=f"Error generating audio: {result}")
+    return TTSBatchResult(**audio_urls(result).model_dump())
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Devuelve (inicio, fin) inclusivos para un Range simple, o None si no hay Range,
+    pide varios rangos o es invalido (en esos casos se responde el archivo completo)."""
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", (header or "").strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-N: los ultimos N bytes
+        suffix = int(end)
+        if suffix == 0:
+            raise RangeNotSatisfiable()
+        return max(0, size - suffix), size - 1
+    start = int(start)
+    if end and int(end) < start:
+        # bytes=500-100 no es un rango valido: RFC 9110 pide ignorarlo y responder 200
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    end = min(int(end), size - 1) if end else size - 1
+    return start, end
+
+
+def memory_audio_response(request: Request, data: bytes, etag: str) -> Response:
+    headers = {"ETag": etag, "Cache-Control": AUDIO_CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    try:
+        byte_range = parse_range(request.headers.get("range"), len(data))
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(data)}"})
+
+    if byte_range is None:
+        return Response(data, media_type="audio/wav", headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+    return Response(data[start:end + 1], status_code=206, media_type="audio/wav", headers=headers)
+
+
+def audio_response(request: Request, filename: str) -> Response:
+    if AUDIO_STORE == "memory":
+        entry = tts_service.cache.read(filename)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        return memory_audio_response(request, *entry)
 
-@app.get("/audio/{filename}")
-async def serve_audio(filename: str):
     file_path = os.path.join(OUTPUT_DIR, filename)
-    if not os.path.exists(file_path):
+    # Solo audios: en outputs/ tambien quedan temporales de escritura
+    if not filename.endswith(".wav") or not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(file_path, media_type="audio/wav")
+    # FileResponse ya resuelve Range y ETag para archivos en disco
+    return FileResponse(file_path, media_type="audio/wav", headers={"Cache-Control": AUDIO_CACHE_CONTROL})
+
+
+async def stream_audio_response(request: Request, text: str, voice: str, speed: float):
+    cached = tts_service.cached_audio(text, voice, speed)
+    if cached is not None:
+        return audio_response(request, cached)
+    if not startup.ready.is_set():
+        raise loading_response()
+
+    def synthesize_segments():
+        # Corre entero en un hilo del pool de sintesis (respeta TTS_WORKERS)
+        segments = []
+        start = time.perf_counter()
+        for audio_int16 in tts_service.iter_audio(text, voice, speed):
+            if not segments:
+                # Tiempo hasta el primer audio: lo que espera el cliente antes de escuchar
+                observe_stage("stream_first_chunk", time.perf_counter() - start)
+            segments.append(audio_int16)
+            yield audio_int16.tobytes()
+        # Lo que se genero en streaming tambien queda en el cache de frases
+        if segments:
+            tts_service.store_audio(text, voice, speed, np.concatenate(segments))
+
+    try:
+        segments = synthesis_pool.stream(synthesize_segments)
+    except PoolSaturatedError as e:
+        raise saturated_response(e)
+
+    async def chunks():
+        yield wav_stream_header()
+        async for chunk in segments:
+            yield chunk
+
+    return StreamingResponse(chunks(), media_type="audio/wav")
+
+
+@app.post("/tts/stream")
+async def stream_tts(request: TTSRequest, http_request: Request):
+    return await stream_audio_response(http_request, request.text, request.voice, request.speed)
+
+
+@app.get("/tts/stream")
+async def stream_tts_get(http_request: Request, text: str, voice: str = "bm_fable", speed: float = 1.0):
+    # Variante GET para poder usarla directamente como src de un <audio>
+    return await stream_audio_response(http_request, text, voice, speed)
+
+
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
+
+
+@app.get("/ready")
+async def ready():
+    return JSONResponse(startup.snapshot(), status_code=200 if startup.ready.is_set() else 503)
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "startup": startup.snapshot(),
+        "memory": workers_memory() if PRELOAD_MODEL else process_memory(),
+        "store": AUDIO_STORE,
+        "cache": tts_service.cache.snapshot(),
+        "pool": synthesis_pool.snapshot(),
+    }
+
+
+@app.on_event("shutdown")
+async def save_cache_index():
+    app.state.cleanup_task.cancel()
+    synthesis_pool.executor.shutdown(wait=False)
+    tts_service.cache.maintain()
+
+
+@app.get("/audio/{filename}")
+async def serve_audio(filename: str, request: Request):
+    return audio_response(request, filename)
@@ -0,0 +1,108 @@
+"""Metricas Prometheus del servicio de TTS y request ID por pedido.
+
+Con varios workers de gunicorn, gunicorn.conf.py define y vacia PROMETHEUS_MULTIPROC_DIR
+y marca los workers que terminan, asi /metrics suma lo de todos los procesos.
+"""
+import contextvars
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Endpoints de monitoreo: no se loguean por pedido
+QUIET_PATHS = ("/metrics", "/ready", "/stats")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REQUEST_SECONDS = Histogram(
+    "tts_request_seconds", "Latencia total por endpoint", ["path", "status"], buckets=LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "tts_stage_seconds",
+    "Latencia por etapa: queue_wait, synthesis, audio_encode, file_write, stream_first_chunk",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+AUDIO_SECONDS = Histogram(
+    "tts_audio_seconds", "Duracion del audio sintetizado por frase", buckets=(0.5, 1, 2, 4, 8, 16, 32, 64)
+)
+BATCH_ITEMS = Histogram("tts_batch_items", "Frases a sintetizar por /tts/batch", buckets=(1, 2, 4, 8, 16, 32, 64))
+CACHE_LOOKUPS = Counter("tts_cache_lookups_total", "Consultas al cache de frases", ["result"])
+POOL_REJECTED = Counter("tts_pool_rejected_total", "Pedidos rechazados con 429 por pool lleno")
+POOL_IN_FLIGHT = Gauge("tts_pool_in_flight", "Sintesis en curso o en cola", multiprocess_mode="livesum")
+POOL_QUEUED = Gauge("tts_pool_queued", "Sintesis esperando un hilo libre", multiprocess_mode="livesum")
+
+request_id_var = contextvars.ContextVar("request_id", default="-")
+# Etapas del pedido actual, para el log y el header Server-Timing
+_request_stages = contextvars.ContextVar("request_stages", default=None)
+
+
+def observe_stage(name: str, seconds: float):
+    STAGE_SECONDS.labels(name).observe(seconds)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+def metrics_response() -> Response:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+def install_request_tracing(app: FastAPI):
+    """Toma el X-Request-ID del backend (o genera uno), lo devuelve en la respuesta
+    y loguea la latencia total y por etapa del pedido."""
+
+    @app.middleware("http")
+    async def trace_request(request: Request, call_next):
+        request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+        id_token = request_id_var.set(request_id)
+        stages_token = _request_stages.set({})
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            elapsed = time.perf_counter() - start
+            stages = _request_stages.get()
+            request_id_var.reset(id_token)
+            _request_stages.reset(stages_token)
+            # Path de la ruta ("/audio/{filename}"), no el de la URL, para acotar las series
+            path = getattr(request.scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.labels(path, str(status)).observe(elapsed)
+
+        response.headers[REQUEST_ID_HEADER] = request_id
+        if stages:
+            response.headers["Server-Timing"] = ", ".join(
+                f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items()
+            )
+        if path not in QUIET_PATHS:
+            detail = "".join(f" {name}={seconds * 1000:.1f}ms" for name, seconds in stages.items())
+            print(f"[{request_id}] {request.method} {path} {status} {elapsed * 1000:.1f}ms{detail}")
+        return response